@@ -0,0 +1,150 @@
+# End-to-end benchmark against the local paladins.guru stand-in (benchmarks/fake_guru_server.py)
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR); sys.path.insert(0, REPO_DIR)
+from fake_guru_server import FakeGuruServer, TRACKED_PLAYER
+
+# Metric -> True when higher is better; used by --baseline to flag regressions
+METRICS = {'history_pages_per_sec': True, 'match_pages_per_sec': True, 'parse_ms_per_page_bs4': False, 'parse_ms_per_page_lxml': False,
+           'db_rows_per_sec': True, 'full_run_matches_per_sec': True, 'peak_rss_mb': False}
+
+def peak_rss_mb():
+    try: import resource
+    except ImportError: return None  # Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10  # bytes on macOS, KiB on Linux
+
+def bench_config(args):
+    """Overrides of DEFAULT_CONFIG for the benchmark; any config.json in the working directory is ignored."""
+    return {"players_to_track": {},
+           "general_settings": {"request_delay_sec": args.request_delay, "max_matches_to_analyze": None, "max_history_pages_to_scan": args.history_pages + 1, "parser_backend": args.parser},
+           "csv_output_options": {"generate_detailed_stats_csv": True, "generate_relations_csv": True, "generate_champ_stats_csv": True, "generate_map_stats_csv": True},
+           "database_options": {"enable_sqlite": True, "db_filename": "bench_stages.sqlite", "force_full_reanalysis": False},
+           "cache_options": {"enable_html_cache": False},
+           "pipeline_options": {"enable_pipeline": args.pipeline},
+           "network_options": {"concurrent_requests": args.concurrency, "max_requests_per_sec": args.max_rps, "adaptive_rate": args.adaptive},
+           "debugging": {"log_level": args.log_level}}
+
+def use_database(paladins, filename):
+    paladins.close_sqlite(); paladins.DB_CFG["db_filename"] = filename; paladins.init_sqlite()
+
+def run_benchmark(args, server):
+    import paladins
+    config = paladins.merge_config(copy.deepcopy(paladins.DEFAULT_CONFIG), bench_config(args))
+    paladins.apply_config(config); paladins.configure_logging(config)
+    paladins.MATCH_BASE_URL = server.base_url
+    paladins.PROFILE_URL_TEMPLATE = server.base_url + "/profile/{id}-{name}/matches"
+    pid, name = TRACKED_PLAYER
+    results = {}
+    try:
+        # 1. History pagination
+        paladins.init_sqlite()
+        before, start = server.stats['history_pages'], time.perf_counter()
+        urls, _ = paladins.download_match_links_for_player(name, pid)
+        elapsed = time.perf_counter() - start
+        results['history_pages_per_sec'] = (server.stats['history_pages'] - before) / elapsed
+
+        # 2. Fetch + parse + queue each match page (serial analyze_single_match)
+        sample = urls[:args.match_sample]
+        start = time.perf_counter()
+        parsed = [paladins.analyze_single_match(url, pid, name, known_match_ids=set()) for url in sample]
+        paladins.flush_sqlite_writes()
+        results['match_pages_per_sec'] = len(sample) / (time.perf_counter() - start)
+
+        # 3. Parse cost alone, per backend, on the same HTML the server sends
+        pages = [(url, server.match_page(url.split("/")[-1])) for url in sample]
+        for backend in paladins.MATCH_PARSER_BACKENDS:
+            start = time.perf_counter()
+            for url, page_html in pages: paladins.parse_match_records(url, page_html, backend=backend)
+            results[f'parse_ms_per_page_{backend}'] = (time.perf_counter() - start) * 1000 / len(pages)
+
+        # 4. Batched SQLite writes (Matches, MatchPlayerStats and aggregate tables) into a fresh database
+        use_database(paladins, "bench_writes.sqlite")
+        records = [paladins.parse_match_records(url, page_html) for url, page_html in pages]
+        n_rows, start = 0, time.perf_counter()
+        for (url, _), (players, map_name, match_dt) in zip(pages, records):
+            paladins.save_match_data_to_sqlite(url.split("/")[-1], map_name, match_dt, players); n_rows += len(players)
+        paladins.flush_sqlite_writes()
+        results['db_rows_per_sec'] = n_rows / (time.perf_counter() - start)
+
+        # 5. Full process_player_analysis (history, matches, SQLite, reports) on a fresh database
+        use_database(paladins, "bench_full.sqlite")
+        before, start = server.stats['match_pages'], time.perf_counter()
+        paladins.process_player_analysis(name, pid)
+        elapsed = time.perf_counter() - start
+        results['full_run_matches_per_sec'] = (server.stats['match_pages'] - before) / elapsed
+        results['full_run_sec'] = elapsed
+    finally:
+        paladins.close_http_pool(); paladins.close_sqlite()
+    results['peak_rss_mb'] = peak_rss_mb()
+    results['matches_found'], results['parsed_ok'] = len(urls), sum(1 for rows, _, _ in parsed if rows)
+    results['server'] = dict(server.stats)
+    return results
+
+def compare_to_baseline(results, baseline, max_regression):
+    """Returns the metrics that got worse than the baseline by more than max_regression (a fraction)."""
+    regressions = []
+    for metric, higher_is_better in METRICS.items():
+        old, new = baseline.get(metric), results.get(metric)
+        if not old or new is None: continue
+        change = (new - old) / old if higher_is_better else (old - new) / old
+        status = "REGRESSION" if change < -max_regression else "ok"
+        print(f"  {metric:<26} {old:>12.2f} -> {new:>12.2f}  ({change:+.1%}) {status}")
+        if status != "ok": regressions.append(metric)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the scraper against a local paladins.guru stand-in.")
+    parser.add_argument("--history-pages", type=int, default=5)
+    parser.add_argument("--matches-per-page", type=int, default=20)
+    parser.add_argument("--match-sample", type=int, default=50, help="Match pages used for the per-page fetch, parse and write stages.")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests the server answers with HTTP 429 (retries back off, so keep this small).")
+    parser.add_argument("--padding-kb", type=int, default=0, help="Extra HTML per page, to mimic real page weight.")
+    parser.add_argument("--parser", choices=["bs4", "lxml"], default="bs4", help="parser_backend used for the fetch and full-run stages.")
+    parser.add_argument("--concurrency", type=int, default=1, help="network_options.concurrent_requests for the full run.")
+    parser.add_argument("--pipeline", action="store_true", help="Enable the staged pipeline for the full run.")
+    parser.add_argument("--request-delay", type=float, default=0.0, help="general_settings.request_delay_sec (0 = no pacing).")
+    parser.add_argument("--max-rps", type=float, default=None, help="network_options.max_requests_per_sec.")
+    parser.add_argument("--adaptive", action="store_true", help="Enable network_options.adaptive_rate (AIMD pacing; starts at --max-rps or the adaptive ceiling).")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", metavar="FILE", help="Write the results to FILE (use it later as --baseline).")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare against a previous --json result and exit 1 on regressions.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown per metric before --baseline fails (default 0.2 = 20%%).")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temporary directory with the databases and CSVs.")
+    args = parser.parse_args()
+    if args.json: args.json = os.path.abspath(args.json)
+    if args.baseline: args.baseline = os.path.abspath(args.baseline)
+
+    server = FakeGuruServer(history_pages=args.history_pages, matches_per_page=args.matches_per_page, latency_ms=args.latency_ms,
+                            jitter_ms=args.jitter_ms, rate_429=args.rate_429, padding_kb=args.padding_kb).start()
+    workdir, cwd = tempfile.mkdtemp(prefix="paladins_bench_"), os.getcwd()
+    os.chdir(workdir)
+    try: results = run_benchmark(args, server)
+    finally:
+        os.chdir(cwd); server.stop()
+        if args.keep_workdir: print(f"Work directory kept at {workdir}")
+        else: shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'metric':<26} {'value':>12}")
+    for metric in METRICS:
+        if results.get(metric) is not None: print(f"{metric:<26} {results[metric]:>12.2f}")
+    print(f"{'full_run_sec':<26} {results['full_run_sec']:>12.2f}")
+    print(f"matches found: {results['matches_found']}, parsed: {results['parsed_ok']}/{min(args.match_sample, results['matches_found'])}, server: {results['server']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(results, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f: baseline = json.load(f)
+        print(f"\nCompared with {args.baseline}:")
+        regressions = compare_to_baseline(results, baseline, args.max_regression)
+        if regressions: print(f"{len(regressions)} metric(s) regressed beyond {args.max_regression:.0%}: {', '.join(regressions)}"); sys.exit(1)
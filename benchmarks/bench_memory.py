@@ -0,0 +1,66 @@
+# Peak-memory benchmark: list-of-dicts + pd.to_numeric (old report path) vs. MatchStatsStore
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pandas as pd
+import paladins
+
+CHAMPIONS = ["Androxus", "Inara", "Grohk", "Ying", "Seris", "Viktor", "Makoa", "Tyra", "Fernando", "Cassie"]
+MAPS = ["Frog Isle", "Jaguar Falls", "Serpent Beach", "Stone Keep", "Ascension Peak", "Brightmarsh"]
+
+def synthetic_rows(n_matches, main_player_id="9256237", seed=1):
+    rnd = random.Random(seed)
+    for m in range(n_matches):
+        match_id, map_name, won_team = str(1000000 + m), rnd.choice(MAPS), rnd.randint(0, 1)
+        ids = [main_player_id] + [str(rnd.randint(1, 5000)) for _ in range(9)]
+        for i, pid in enumerate(ids):
+            kills, deaths, assists = rnd.randint(0, 30), rnd.randint(0, 15), rnd.randint(0, 30)
+            yield {'MatchID': match_id, 'MapName': map_name, 'MatchDateTime': f"2024-05-{1 + m % 28:02d}T18:00:00",
+                   'PlayerID': pid, 'PlayerName': f"Player{pid}", 'Champion': rnd.choice(CHAMPIONS), 'TeamIdx': 1 if (i < 5) == bool(won_team) else 0,
+                   'WonMatch': (i < 5) == bool(won_team), 'Level': rnd.randint(1, 300), 'Kills': kills, 'Deaths': deaths, 'Assists': assists,
+                   'KDA': round((kills + assists) / max(deaths, 1), 2), 'Credits': rnd.randint(0, 20000), 'CPM': rnd.randint(0, 900),
+                   'DamageDealt': rnd.randint(0, 250000), 'DamageTaken': rnd.randint(0, 150000), 'Shielding': rnd.randint(0, 100000), 'Healing': rnd.randint(0, 100000)}
+
+def list_of_dicts_path(n_matches, main_player_id):
+    """The report path before MatchStatsStore: one dict per row, DataFrame, then to_numeric copies."""
+    rows = list(synthetic_rows(n_matches, main_player_id))
+    df_run_stats = pd.DataFrame(rows)
+    df_player = df_run_stats[df_run_stats['PlayerID'] == main_player_id].copy()
+    for c in ['Level','Kills','Deaths','Assists','KDA','Credits','CPM','DamageDealt','DamageTaken','Shielding','Healing','WonMatch']:
+        df_player.loc[:, c] = pd.to_numeric(df_player[c], errors='coerce')
+    df_player.loc[:, 'Wins'] = df_player['WonMatch'].astype(int)
+    champs = df_player.groupby('Champion').agg(P=('MatchID','nunique'), V=('Wins','sum'), KDA_avg=('KDA','mean'))
+    df_main_numeric = df_run_stats[df_run_stats['PlayerID'] == main_player_id].copy()
+    for c in ['KDA','Kills','Deaths','Assists','DamageDealt','Healing','Shielding','Credits','CPM','Level']:
+        df_main_numeric.loc[:, c] = pd.to_numeric(df_main_numeric[c], errors='coerce')
+    return champs, df_main_numeric['KDA'].mean()
+
+def columnar_path(n_matches, main_player_id):
+    store = paladins.MatchStatsStore()
+    store.extend(synthetic_rows(n_matches, main_player_id))
+    df_run_stats = store.to_frame()
+    df_player = df_run_stats[df_run_stats['PlayerID'] == main_player_id]
+    champs = df_player.groupby('Champion', observed=True).agg(P=('MatchID','nunique'), V=('WonMatch','sum'), KDA_avg=('KDA','mean'))
+    return champs, df_player['KDA'].mean()
+
+def measure(fn, n_matches):
+    tracemalloc.start(); start = time.perf_counter()
+    result = fn(n_matches, "9256237")
+    elapsed = time.perf_counter() - start; _, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    return peak, elapsed, result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare peak memory of the old list-of-dicts report path with MatchStatsStore.")
+    parser.add_argument("--matches", type=int, nargs="+", default=[1000, 5000, 20000], help="Match counts to benchmark (10 player rows per match).")
+    args = parser.parse_args()
+    print(f"{'matches':>8} {'rows':>8} | {'dicts peak MB':>13} {'time s':>7} | {'store peak MB':>13} {'time s':>7} | {'ratio':>5}")
+    for n in args.matches:
+        old_peak, old_time, old_result = measure(list_of_dicts_path, n)
+        new_peak, new_time, new_result = measure(columnar_path, n)
+        assert abs(old_result[1] - new_result[1]) < 1e-9 and old_result[0]['P'].tolist() == new_result[0]['P'].tolist(), "aggregations differ"
+        print(f"{n:>8} {n * 10:>8} | {old_peak / 2**20:>13.1f} {old_time:>7.2f} | {new_peak / 2**20:>13.1f} {new_time:>7.2f} | {old_peak / new_peak:>5.1f}x")
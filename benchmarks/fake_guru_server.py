@@ -0,0 +1,126 @@
+# Local paladins.guru stand-in: synthetic profile history pages and match pages for offline benchmarks
+import argparse
+import http.server
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+CHAMPIONS = ["Androxus", "Inara", "Grohk", "Ying", "Seris", "Viktor", "Makoa", "Tyra", "Fernando", "Cassie", "Jenos", "Khan"]
+MAPS = ["Frog Isle", "Jaguar Falls", "Serpent Beach", "Stone Keep", "Ascension Peak", "Brightmarsh", "Fish Market"]
+TRACKED_PLAYER = ("9256237", "Makoichi")
+
+class FakeGuruServer(http.server.ThreadingHTTPServer):
+    """
+    Serves /profile/<id>-<name>/matches[?page=N] history pages (div.match-history-list links + ul.pagination)
+    and /match/<id> pages (section#match-stats with scoreboard and performance tables). Pages are
+    deterministic per ID; size, latency and the share of HTTP 429 answers are configurable.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, history_pages=5, matches_per_page=20, players_per_team=5, player_pool=400,
+                 latency_ms=0, jitter_ms=0, rate_429=0.0, retry_after=1, padding_kb=0, first_match_id=90000000):
+        super().__init__(("127.0.0.1", port), FakeGuruHandler)
+        self.history_pages, self.matches_per_page, self.players_per_team, self.player_pool = history_pages, matches_per_page, players_per_team, player_pool
+        self.latency_ms, self.jitter_ms, self.rate_429, self.retry_after = latency_ms, jitter_ms, rate_429, retry_after
+        self.padding = "<!-- " + "x" * (padding_kb * 1024) + " -->" if padding_kb else ""
+        self.first_match_id = first_match_id
+        self.stats, self.stats_lock, self.rng = {'requests': 0, 'history_pages': 0, 'match_pages': 0, 'throttled': 0}, threading.Lock(), random.Random(7)
+        self.thread = None
+
+    @property
+    def base_url(self): return f"http://127.0.0.1:{self.server_address[1]}"
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True); self.thread.start(); return self
+    def stop(self):
+        self.shutdown(); self.server_close()
+    def count(self, key):
+        with self.stats_lock: self.stats[key] += 1
+    def should_throttle(self):
+        with self.stats_lock: return self.rate_429 > 0 and self.rng.random() < self.rate_429
+
+    def match_ids(self):
+        return [str(self.first_match_id - i) for i in range(self.history_pages * self.matches_per_page)]
+
+    def history_page(self, page):
+        start = (page - 1) * self.matches_per_page
+        ids = [str(self.first_match_id - i) for i in range(start, start + self.matches_per_page)] if page <= self.history_pages else []
+        links = "".join(f'<div class="match-card"><a href="/match/{mid}">Match {mid}</a></div>' for mid in ids)
+        next_class = "page-item disabled" if page >= self.history_pages else "page-item"
+        return (f'<!DOCTYPE html><html><head><title>Match History</title></head><body>{self.padding}'
+                f'<div class="match-history-list">{links}</div>'
+                f'<ul class="pagination"><li class="page-item"><a href="?page={max(page - 1, 1)}">Previous</a></li>'
+                f'<li class="page-item active"><a>{page}</a></li><li class="{next_class}"><a href="?page={page + 1}">Next</a></li></ul></body></html>')
+
+    def match_page(self, match_id):
+        rnd = random.Random(int(match_id))
+        others = rnd.sample(range(1, self.player_pool + 1), self.players_per_team * 2 - 1)
+        players = [TRACKED_PLAYER] + [(str(pid), f"Player{pid}") for pid in others]
+        rnd.shuffle(players)
+        teams, winner = (players[:self.players_per_team], players[self.players_per_team:]), rnd.randint(0, 1)
+        champs = {pid: rnd.choice(CHAMPIONS) for pid, _ in players}
+
+        def player_cell(pid, name):
+            return (f'<div class="row__player"><img class="row__player__img" src="/img/{champs[pid]}.png" alt="{champs[pid]}">'
+                    f'<a class="row__player__name" href="/profile/{pid}-{name}">{name}</a></div>')
+        def scoreboard(team, won):
+            rows = "".join(f'<div class="row match-table__row">{player_cell(pid, name)}<div class="row__item">{rnd.randint(1, 300)}</div>'
+                           f'<div class="row__item">{rnd.randint(0, 30)} / {rnd.randint(0, 15)} / {rnd.randint(0, 30)}</div>'
+                           + "".join(f'<div class="row__item">{rnd.randint(0, 250000):,}</div>' for _ in range(5)) + '</div>' for pid, name in team)
+            return (f'<div class="match-table{" win" if won else " loss"}"><div class="match-table__header"><div>Player</div><div>Level</div>'
+                    f'<div>K/D/A</div><div>Credits</div><div>CPM</div><div>Damage</div><div>Taken</div><div>Shielding</div></div>{rows}</div>')
+        def performance(team, won):
+            rows = "".join(f'<div class="row match-table__row">{player_cell(pid, name)}<div class="row__item">{rnd.randint(0, 150000):,}</div>'
+                           f'<div class="row__item">{rnd.randint(0, 5000):,}</div><div class="row__item">{rnd.randint(0, 100000):,}</div>'
+                           f'<div class="row__item">{rnd.randint(0, 20000):,}</div></div>' for pid, name in team)
+            return (f'<div class="match-table{" win" if won else " loss"}"><div class="match-table__header"><div>Player</div><div>Weapon</div>'
+                    f'<div>Objective</div><div>Healing</div><div>Self Healing</div></div>{rows}</div>')
+        tables = scoreboard(teams[0], winner == 0) + scoreboard(teams[1], winner == 1) + performance(teams[0], winner == 0) + performance(teams[1], winner == 1)
+        return (f'<!DOCTYPE html><html><head><title>Match {match_id}</title></head><body>{self.padding}'
+                f'<div class="match-header"><div class="match-header__map-name">{rnd.choice(MAPS)}</div>'
+                f'<div class="match-header__time"><span>{rnd.randint(1, 23)} hours ago</span></div></div>'
+                f'<section id="match-stats">{tables}</section></body></html>')
+
+class FakeGuruHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+
+    def log_message(self, *args): pass
+
+    def send_body(self, status, body, headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8"); self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items(): self.send_header(key, value)
+        self.end_headers(); self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server; server.count('requests')
+        if server.latency_ms or server.jitter_ms: time.sleep((server.latency_ms + random.uniform(0, server.jitter_ms)) / 1000)
+        if server.should_throttle():
+            server.count('throttled'); return self.send_body(429, "Too Many Requests", {"Retry-After": str(server.retry_after)})
+        url = urlparse(self.path)
+        match = re.fullmatch(r'/match/(\d+)', url.path)
+        if match: server.count('match_pages'); return self.send_body(200, server.match_page(match.group(1)))
+        if re.fullmatch(r'/profile/\d+-[^/]+/matches', url.path):
+            server.count('history_pages')
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            return self.send_body(200, server.history_page(page))
+        self.send_body(404, "Not Found")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local paladins.guru stand-in serving synthetic history and match pages.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--history-pages", type=int, default=5)
+    parser.add_argument("--matches-per-page", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Fixed delay added to every response.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra delay (0..jitter) per response.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with HTTP 429 (0..1).")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After header (seconds) sent with 429 answers.")
+    parser.add_argument("--padding-kb", type=int, default=0, help="Extra HTML per page, to mimic real page weight.")
+    args = parser.parse_args()
+    server = FakeGuruServer(args.port, args.history_pages, args.matches_per_page, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            rate_429=args.rate_429, retry_after=args.retry_after, padding_kb=args.padding_kb)
+    print(f"Serving fake paladins.guru on {server.base_url} (profile: {server.base_url}/profile/{TRACKED_PLAYER[0]}-{TRACKED_PLAYER[1]}/matches)")
+    try: server.serve_forever()
+    except KeyboardInterrupt: server.server_close()
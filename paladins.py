@@ -1,20 +1,35 @@
 # PaladinsGuru Deep Match Analyzer - Iteration 5.3
-from curl_cffi import requests
-import pandas as pd
-from bs4 import BeautifulSoup
+# Importing this module has no side effects: pandas, numpy, BeautifulSoup, curl_cffi, lxml and zstandard are
+# imported where they are first needed, and config.json/logging are only touched by the CLI (see __main__) or
+# explicitly through load_config()/apply_config()/configure_logging() and the Analyzer class.
 from colorama import Fore, Style, init as colorama_init
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import queue
+from urllib.parse import urlparse
+import threading
 import os
+import sys
 import re
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import copy
 import json
 import sqlite3
 import logging
 import argparse
 import random
+import socket
+import cProfile
+import pstats
+from array import array
+import hashlib
+import gzip
 
-colorama_init(autoreset=True)
+log = logging.getLogger("paladins")
+log.addHandler(logging.NullHandler())
 
 # --- GLOBAL CONFIGURATION LOADED FROM JSON ---
 CONFIG_FILE = "config.json"
@@ -26,44 +41,112 @@ DEFAULT_CONFIG = {
         "max_history_pages_to_scan": 50,
         "top_n_relations_to_show": 10,
         "analyze_champion_stats": True,
-        "analyze_map_stats": True
+        "analyze_map_stats": True,
+        "parser_backend": "bs4",
+        "incremental_history_scan": True,
+        "group_crawl_tracked_players": False
     },
     "csv_output_options": { "generate_detailed_stats_csv": True, "generate_relations_csv": True, "generate_champ_stats_csv": True, "generate_map_stats_csv": True },
-    "database_options": { "enable_sqlite": True, "db_filename": "paladins_analysis.sqlite", "force_full_reanalysis": False },
+    "parquet_options": { "enable_parquet_export": False, "dataset_dir": "parquet_dataset" },
+    "database_options": { "enable_sqlite": True, "db_filename": "paladins_analysis.sqlite", "force_full_reanalysis": False, "write_batch_size": 50, "journal_mode": "WAL" },
+    "cache_options": { "enable_html_cache": False, "cache_dir": "html_cache", "compression": "gzip", "history_page_ttl_sec": 3600 },
+    "pipeline_options": { "enable_pipeline": False, "fetch_workers": 4, "parse_workers": 2, "fetch_queue_size": 16, "parse_queue_size": 8 },
+    "network_options": { "concurrent_requests": 1, "max_requests_per_sec": None, "rate_limit_burst": 2, "session_pool_size": 4, "session_idle_timeout_sec": 60,
+                         "adaptive_rate": True, "min_requests_per_sec": 0.2, "max_adaptive_requests_per_sec": 5.0, "rate_increase_step": 0.05, "rate_decrease_factor": 0.5,
+                         "circuit_breaker_threshold": 5, "circuit_breaker_cooldown_sec": 60, "max_retry_after_sec": 300 },
+    "frontier_options": { "enable_frontier": False, "claim_batch_size": 25, "lease_sec": 600, "max_attempts": 3, "worker_id": None },
+    "metrics_options": { "log_summary": True, "export_file": None },
     "debugging": { "log_level": "INFO" }
 }
 
-def load_config():
-    config = DEFAULT_CONFIG.copy();
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            try:
-                user_config = json.load(f)
-                for key, value in user_config.items():
-                    if isinstance(value, dict) and key in config and isinstance(config[key], dict): config[key].update(value)
-                    else: config[key] = value
-            except json.JSONDecodeError: print(f"{Fore.RED}[CONFIG] Error reading {CONFIG_FILE}. Using defaults.")
-    else:
-        print(f"{Fore.YELLOW}[CONFIG] {CONFIG_FILE} not found. Creating a default example.")
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f: json.dump(DEFAULT_CONFIG, f, indent=4, ensure_ascii=False)
+def merge_config(config, overrides):
+    """Merges `overrides` into `config` in place: section dicts are updated key by key, anything else is replaced."""
+    for key, value in overrides.items():
+        if isinstance(value, dict) and key in config and isinstance(config[key], dict): config[key].update(value)
+        else: config[key] = value
     return config
 
-config = load_config()
+def load_config(config_file=None, create_if_missing=False):
+    """DEFAULT_CONFIG merged with config_file (default: config.json); the CLI asks for an example file to be written when it is missing."""
+    config_file = config_file or CONFIG_FILE
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            try: merge_config(config, json.load(f))
+            except json.JSONDecodeError: print(f"{Fore.RED}[CONFIG] Error reading {config_file}. Using defaults.")
+    elif create_if_missing:
+        print(f"{Fore.YELLOW}[CONFIG] {config_file} not found. Creating a default example.")
+        with open(config_file, 'w', encoding='utf-8') as f: json.dump(DEFAULT_CONFIG, f, indent=4, ensure_ascii=False)
+    return config
 
 # --- LOGGING CONFIGURATION ---
-log_level_str = config.get("debugging", {}).get("log_level", "INFO").upper()
-numeric_log_level = getattr(logging, log_level_str, logging.INFO)
-log_format = '%(asctime)s - %(levelname)s - %(message)s'
-logging.basicConfig(level=numeric_log_level, format=log_format, datefmt='%Y-%m-%d %H:%M:%S')
+def configure_logging(config):
+    """CLI logging: colored output on the root logger at debugging.log_level. Embedding applications configure logging themselves."""
+    colorama_init(autoreset=True)
+    log_level_str = str(config.get("debugging", {}).get("log_level", "INFO")).upper()
+    logging.basicConfig(level=getattr(logging, log_level_str, logging.INFO), format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
 # --- ACCESS TO CONFIGURATION VALUES ---
-GENERAL_CFG = config.get("general_settings", DEFAULT_CONFIG["general_settings"])
-CSV_CFG = config.get("csv_output_options", DEFAULT_CONFIG["csv_output_options"])
-DB_CFG = config.get("database_options", DEFAULT_CONFIG["database_options"])
-REQUEST_DELAY = GENERAL_CFG.get("request_delay_sec", 0.8)
-MAX_MATCHES_PER_PLAYER = GENERAL_CFG.get("max_matches_to_analyze", None)
-MAX_PAGES_TO_SCAN_HISTORY = GENERAL_CFG.get("max_history_pages_to_scan", 50)
-TOP_N_RELATIONS = GENERAL_CFG.get("top_n_relations_to_show", 10)
+# Module globals derived from the active config; apply_config sets them (and `config`) and Analyzer swaps them in and out
+CONFIG_GLOBALS = ('GENERAL_CFG', 'CSV_CFG', 'PARQUET_CFG', 'DB_CFG', 'NET_CFG', 'CACHE_CFG', 'PIPELINE_CFG', 'FRONTIER_CFG', 'METRICS_CFG',
+                  'REQUEST_DELAY', 'MAX_MATCHES_PER_PLAYER', 'MAX_PAGES_TO_SCAN_HISTORY', 'TOP_N_RELATIONS', 'PARSER_BACKEND',
+                  'INCREMENTAL_HISTORY_SCAN', 'CONCURRENT_REQUESTS', 'MAX_REQUESTS_PER_SEC', 'RATE_LIMIT_BURST', 'SESSION_POOL_SIZE',
+                  'SESSION_IDLE_TIMEOUT', 'ADAPTIVE_RATE', 'PIPELINE_ENABLED', 'PIPELINE_FETCH_WORKERS', 'PIPELINE_PARSE_WORKERS',
+                  'PIPELINE_FETCH_QUEUE', 'PIPELINE_PARSE_QUEUE', 'FRONTIER_ENABLED', 'FRONTIER_BATCH', 'FRONTIER_LEASE_SEC',
+                  'FRONTIER_MAX_ATTEMPTS', 'WORKER_ID', 'WRITE_BATCH_SIZE', 'RATE_LIMITER', 'HTTP_POOL', 'HTML_CACHE')
+
+def apply_config(new_config):
+    """
+    Makes `new_config` (a full config dict, see load_config) the active configuration of the module-level functions:
+    sets `config` and every name of CONFIG_GLOBALS, including a fresh rate limiter, HTTP session pool and HTML cache.
+    Returns those settings as a dict.
+    """
+    global config, GENERAL_CFG, CSV_CFG, PARQUET_CFG, DB_CFG, NET_CFG, CACHE_CFG, PIPELINE_CFG, FRONTIER_CFG, METRICS_CFG, REQUEST_DELAY, \
+           MAX_MATCHES_PER_PLAYER, MAX_PAGES_TO_SCAN_HISTORY, TOP_N_RELATIONS, PARSER_BACKEND, INCREMENTAL_HISTORY_SCAN, CONCURRENT_REQUESTS, \
+           MAX_REQUESTS_PER_SEC, RATE_LIMIT_BURST, SESSION_POOL_SIZE, SESSION_IDLE_TIMEOUT, ADAPTIVE_RATE, PIPELINE_ENABLED, PIPELINE_FETCH_WORKERS, \
+           PIPELINE_PARSE_WORKERS, PIPELINE_FETCH_QUEUE, PIPELINE_PARSE_QUEUE, FRONTIER_ENABLED, FRONTIER_BATCH, FRONTIER_LEASE_SEC, \
+           FRONTIER_MAX_ATTEMPTS, WORKER_ID, WRITE_BATCH_SIZE, RATE_LIMITER, HTTP_POOL, HTML_CACHE
+    config = new_config
+    GENERAL_CFG = config.get("general_settings", DEFAULT_CONFIG["general_settings"])
+    CSV_CFG = config.get("csv_output_options", DEFAULT_CONFIG["csv_output_options"])
+    PARQUET_CFG = config.get("parquet_options", DEFAULT_CONFIG["parquet_options"])
+    DB_CFG = config.get("database_options", DEFAULT_CONFIG["database_options"])
+    NET_CFG = config.get("network_options", DEFAULT_CONFIG["network_options"])
+    CACHE_CFG = config.get("cache_options", DEFAULT_CONFIG["cache_options"])
+    PIPELINE_CFG = config.get("pipeline_options", DEFAULT_CONFIG["pipeline_options"])
+    FRONTIER_CFG = config.get("frontier_options", DEFAULT_CONFIG["frontier_options"])
+    METRICS_CFG = config.get("metrics_options", DEFAULT_CONFIG["metrics_options"])
+    REQUEST_DELAY = GENERAL_CFG.get("request_delay_sec", 0.8)
+    MAX_MATCHES_PER_PLAYER = GENERAL_CFG.get("max_matches_to_analyze", None)
+    MAX_PAGES_TO_SCAN_HISTORY = GENERAL_CFG.get("max_history_pages_to_scan", 50)
+    TOP_N_RELATIONS = GENERAL_CFG.get("top_n_relations_to_show", 10)
+    PARSER_BACKEND = GENERAL_CFG.get("parser_backend", "bs4")
+    INCREMENTAL_HISTORY_SCAN = GENERAL_CFG.get("incremental_history_scan", True)
+    CONCURRENT_REQUESTS = max(1, int(NET_CFG.get("concurrent_requests") or 1))
+    MAX_REQUESTS_PER_SEC = NET_CFG.get("max_requests_per_sec") or (1.0 / REQUEST_DELAY if REQUEST_DELAY else None)
+    RATE_LIMIT_BURST = NET_CFG.get("rate_limit_burst", 2)
+    SESSION_POOL_SIZE = max(1, int(NET_CFG.get("session_pool_size") or 1))
+    SESSION_IDLE_TIMEOUT = NET_CFG.get("session_idle_timeout_sec", 60)
+    ADAPTIVE_RATE = bool(NET_CFG.get("adaptive_rate", True))
+    PIPELINE_ENABLED = bool(PIPELINE_CFG.get("enable_pipeline"))
+    PIPELINE_FETCH_WORKERS = max(1, int(PIPELINE_CFG.get("fetch_workers") or 1))
+    PIPELINE_PARSE_WORKERS = max(1, int(PIPELINE_CFG.get("parse_workers") or 1))
+    PIPELINE_FETCH_QUEUE = max(1, int(PIPELINE_CFG.get("fetch_queue_size") or 1))
+    PIPELINE_PARSE_QUEUE = max(1, int(PIPELINE_CFG.get("parse_queue_size") or 1))
+    FRONTIER_ENABLED = bool(FRONTIER_CFG.get("enable_frontier"))
+    FRONTIER_BATCH = max(1, int(FRONTIER_CFG.get("claim_batch_size") or 1))
+    FRONTIER_LEASE_SEC = float(FRONTIER_CFG.get("lease_sec") or 600)
+    FRONTIER_MAX_ATTEMPTS = max(1, int(FRONTIER_CFG.get("max_attempts") or 1))
+    WORKER_ID = FRONTIER_CFG.get("worker_id") or f"{socket.gethostname()}:{os.getpid()}"
+    WRITE_BATCH_SIZE = max(1, int(DB_CFG.get("write_batch_size") or 1))
+    if ADAPTIVE_RATE:
+        RATE_LIMITER = AdaptiveRateLimiter(MAX_REQUESTS_PER_SEC, RATE_LIMIT_BURST, NET_CFG.get("min_requests_per_sec", 0.2), NET_CFG.get("max_adaptive_requests_per_sec", 5.0),
+                                           NET_CFG.get("rate_increase_step", 0.05), NET_CFG.get("rate_decrease_factor", 0.5), NET_CFG.get("circuit_breaker_threshold", 5),
+                                           NET_CFG.get("circuit_breaker_cooldown_sec", 60), NET_CFG.get("max_retry_after_sec", 300))
+    else: RATE_LIMITER = HostRateLimiter(MAX_REQUESTS_PER_SEC, RATE_LIMIT_BURST) if MAX_REQUESTS_PER_SEC else None
+    HTTP_POOL = SessionPool(SESSION_POOL_SIZE, SESSION_IDLE_TIMEOUT)
+    HTML_CACHE = HtmlCache(CACHE_CFG.get("cache_dir", "html_cache"), CACHE_CFG.get("compression", "gzip"), CACHE_CFG.get("history_page_ttl_sec", 3600)) if CACHE_CFG.get("enable_html_cache") else None
+    return {name: globals()[name] for name in CONFIG_GLOBALS}
 
 # --- GLOBAL CONSTANTS AND HTML SELECTORS ---
 MATCH_BASE_URL = "https://paladins.guru"
@@ -92,6 +175,7 @@ PROFILE_URL_TEMPLATE = "https://paladins.guru/profile/{id}-{name}/matches"
 PROFILE_MATCH_LINK_SELECTOR = "a[href^='/match/']"
 PAGINATION_UL_SELECTOR = "ul.pagination"
 MATCH_STATS_SECTION_SELECTOR = "section#match-stats"
+MATCH_STATS_SECTION_RE = re.compile(r'<section\b[^>]*\bid\s*=\s*["\']?match-stats\b', re.IGNORECASE)  # cheap check for the same section, without parsing
 PLAYER_ROW_SELECTOR = "div.row.match-table__row"
 PLAYER_INFO_CONTAINER_SELECTOR = "div.row__player"
 PLAYER_NAME_SELECTOR = "a.row__player__name"
@@ -99,87 +183,694 @@ PLAYER_CHAMP_IMG_SELECTOR = "img.row__player__img"
 MAP_NAME_SELECTOR = "div.match-header__map-name, span.match-title__map, div.map-name"
 DATETIME_AGO_SELECTOR = "div.match-header__time span, span.timeago, time.timeago"
 
+# --- RUN METRICS ---
+class RunMetrics:
+    """
+    Thread-safe counters and latency histograms for one run. Stages are timed with METRICS.timer(name)
+    (or METRICS.sleep for deliberate waits); everything can be logged as an end-of-run summary or exported
+    as JSON / Prometheus text. Histograms use fixed, Prometheus-style cumulative buckets (seconds).
+    """
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    def __init__(self):
+        self.lock, self.started = threading.Lock(), time.perf_counter()
+        self.counters, self.histograms, self.gauges = defaultdict(int), {}, {}
+    def inc(self, name, value=1):
+        with self.lock: self.counters[name] += value
+    def gauge(self, name, value):
+        with self.lock: self.gauges[name] = value
+    def observe(self, name, seconds):
+        with self.lock:
+            hist = self.histograms.get(name)
+            if hist is None: hist = self.histograms[name] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.BUCKETS)}
+            hist['count'] += 1; hist['sum'] += seconds; hist['max'] = max(hist['max'], seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound: hist['buckets'][i] += 1; break
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(name, time.perf_counter() - start)
+    def sleep(self, name, seconds):
+        if seconds > 0: time.sleep(seconds); self.observe(name, seconds)
+    def _quantile(self, hist, q):
+        """Upper bound of the bucket holding the q-quantile (the max if it falls past the last bucket)."""
+        target, seen = q * hist['count'], 0
+        for bound, count in zip(self.BUCKETS, hist['buckets']):
+            seen += count
+            if seen >= target: return min(bound, hist['max'])
+        return hist['max']
+    def to_dict(self):
+        with self.lock:
+            return {'wall_time_sec': round(time.perf_counter() - self.started, 3), 'counters': dict(self.counters), 'gauges': dict(self.gauges),
+                    'timers': {name: {'count': h['count'], 'total_sec': round(h['sum'], 6), 'mean_ms': round(h['sum'] / h['count'] * 1000, 3),
+                                      'p50_ms': round(self._quantile(h, 0.5) * 1000, 3), 'p95_ms': round(self._quantile(h, 0.95) * 1000, 3), 'max_ms': round(h['max'] * 1000, 3),
+                                      'buckets': {str(b): c for b, c in zip(self.BUCKETS, h['buckets'])}} for name, h in self.histograms.items()}}
+    def to_prometheus(self, prefix="paladins"):
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+            for name, hist in sorted(self.histograms.items()):
+                metric, cumulative = f"{prefix}_{name}_seconds", 0
+                lines.append(f"# TYPE {metric} histogram")
+                for bound, count in zip(self.BUCKETS, hist['buckets']): cumulative += count; lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines += [f'{metric}_bucket{{le="+Inf"}} {hist["count"]}', f"{metric}_sum {hist['sum']:.6f}", f"{metric}_count {hist['count']}"]
+            for name, value in sorted(self.gauges.items()): lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+            lines += [f"# TYPE {prefix}_wall_time_seconds gauge", f"{prefix}_wall_time_seconds {time.perf_counter() - self.started:.3f}"]
+        return "\n".join(lines) + "\n"
+    def write(self, path):
+        """Writes Prometheus text format for .prom/.txt files, JSON otherwise."""
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                if path.endswith((".prom", ".txt")): f.write(self.to_prometheus())
+                else: json.dump(self.to_dict(), f, indent=4)
+            log.info(f"{Fore.GREEN}Run metrics written to {path}.{Style.RESET_ALL}")
+        except OSError as e: log.error(f"{Fore.RED}Could not write metrics to {path}: {e}{Style.RESET_ALL}")
+    def log_summary(self):
+        data = self.to_dict()
+        if not data['timers'] and not data['counters']: return
+        log.info(f"{Fore.CYAN}--- RUN METRICS ({data['wall_time_sec']:.1f}s wall) ---{Style.RESET_ALL}")
+        log.info(f"  {'stage':<18} {'count':>7} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for name, t in sorted(data['timers'].items(), key=lambda item: -item[1]['total_sec']):
+            log.info(f"  {name:<18} {t['count']:>7} {t['total_sec']:>9.2f} {t['mean_ms']:>9.1f} {t['p95_ms']:>9.1f} {t['max_ms']:>9.1f}")
+        if data['counters']: log.info("  " + ", ".join(f"{name}={value}" for name, value in sorted(data['counters'].items())))
+        if data['gauges']: log.info("  " + ", ".join(f"{name}={value}" for name, value in sorted(data['gauges'].items())))
+
+METRICS = RunMetrics()
+
+# --profile: before Python 3.12 a cProfile profiler only sees the thread that enabled it, so worker threads
+# (concurrent fetches, pipeline stages) get one profiler each, merged into the report; None when not needed.
+THREAD_PROFILERS = None
+THREAD_PROFILER_LOCAL = threading.local()
+def profiled(target):
+    """Wraps a callable run on a worker thread so that --profile also records it."""
+    if THREAD_PROFILERS is None: return target
+    def run(*args, **kwargs):
+        profiler = getattr(THREAD_PROFILER_LOCAL, 'profiler', None)
+        if profiler is None: profiler = THREAD_PROFILER_LOCAL.profiler = cProfile.Profile(); THREAD_PROFILERS.append(profiler)
+        profiler.enable()
+        try: return target(*args, **kwargs)
+        finally: profiler.disable()
+    return run
+def start_profiling():
+    """Main-thread profiler for --profile; also turns on per-thread profilers where the main one cannot see worker threads."""
+    global THREAD_PROFILERS
+    # Python 3.12+ runs cProfile on sys.monitoring: one profiler at a time, and it already covers every thread
+    THREAD_PROFILERS = [] if sys.version_info < (3, 12) else None
+    profiler = cProfile.Profile(); profiler.enable()
+    return profiler
+def save_profile(profiler, path):
+    profiler.disable()
+    stats = pstats.Stats(profiler, *(THREAD_PROFILERS or ())); stats.dump_stats(path)
+    with open(f"{path}.txt", 'w', encoding='utf-8') as f: stats.stream = f; stats.sort_stats("cumulative").print_stats(40)
+    log.info(f"{Fore.GREEN}Profile saved to {path} (top functions in {path}.txt, {len(THREAD_PROFILERS or ())} worker threads merged).{Style.RESET_ALL}")
+    if PIPELINE_ENABLED: log.warning(f"{Fore.YELLOW}Parse worker processes are not profiled: their time shows up as waiting in the pipeline writer. Turn enable_pipeline off to profile parsing.{Style.RESET_ALL}")
+
 # --- SQLITE DATABASE LOGIC ---
 DB_CONN = None; DB_CURSOR = None
+# Write buffer: parsed matches are queued here and inserted WRITE_BATCH_SIZE at a time in one transaction.
+PENDING_MATCH_ROWS, PENDING_PLAYER_ROWS, PENDING_MATCH_IDS, PENDING_MATCH_PLAYERS = [], [], set(), []
+# journal_mode comes from database_options: WAL needs shared memory, so a database on a network filesystem needs DELETE
+SQLITE_JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")
+SQLITE_PRAGMAS = ["PRAGMA synchronous=NORMAL", "PRAGMA temp_store=MEMORY", "PRAGMA cache_size=-32000", "PRAGMA foreign_keys=OFF"]
+PLAYER_STATS_COLUMNS = ['MatchID','PlayerID','PlayerName','Champion','TeamIdx','WonMatch','Level','Kills','Deaths','Assists','KDA','Credits','CPM','DamageDealt','DamageTaken','Shielding','Healing']
 def init_sqlite():
     global DB_CONN, DB_CURSOR
     if DB_CFG.get("enable_sqlite"):
         db_name = DB_CFG.get("db_filename", "paladins_analysis.sqlite")
         try:
-            DB_CONN = sqlite3.connect(db_name); DB_CURSOR = DB_CONN.cursor()
-            logging.info(f"{Fore.GREEN}Connected to SQLite database: {db_name}{Style.RESET_ALL}")
+            # Not tied to the opening thread: an embedding service may call an Analyzer from any thread (calls are serialized by ANALYZER_LOCK)
+            DB_CONN = sqlite3.connect(db_name, timeout=30, check_same_thread=False); DB_CURSOR = DB_CONN.cursor()
+            log.info(f"{Fore.GREEN}Connected to SQLite database: {db_name}{Style.RESET_ALL}")
+            journal_mode = str(DB_CFG.get("journal_mode") or "WAL").upper()
+            if journal_mode not in SQLITE_JOURNAL_MODES: log.warning(f"{Fore.YELLOW}Unknown journal_mode '{journal_mode}' in {CONFIG_FILE}, using WAL.{Style.RESET_ALL}"); journal_mode = "WAL"
+            active_mode = DB_CURSOR.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+            if active_mode.upper() != journal_mode: log.warning(f"{Fore.YELLOW}SQLite kept journal mode '{active_mode}' instead of '{journal_mode}'.{Style.RESET_ALL}")
+            for pragma in SQLITE_PRAGMAS: DB_CURSOR.execute(pragma)
             DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS Matches (MatchID TEXT PRIMARY KEY, MapName TEXT, MatchDateTime TEXT)')
             DB_CURSOR.execute('''CREATE TABLE IF NOT EXISTS MatchPlayerStats (StatID INTEGER PRIMARY KEY AUTOINCREMENT, MatchID TEXT, PlayerID TEXT, PlayerName TEXT, Champion TEXT, TeamIdx INTEGER, WonMatch INTEGER, Level INTEGER, Kills INTEGER, Deaths INTEGER, Assists INTEGER, KDA REAL, Credits INTEGER, CPM INTEGER, DamageDealt INTEGER, DamageTaken INTEGER, Shielding INTEGER, Healing INTEGER, FOREIGN KEY (MatchID) REFERENCES Matches (MatchID))''')
-            DB_CONN.commit(); logging.info(f"{Fore.GREEN}SQLite tables verified/created.{Style.RESET_ALL}")
-        except sqlite3.Error as e: logging.error(f"{Fore.RED}Error initializing SQLite with {db_name}: {e}{Style.RESET_ALL}"); DB_CFG["enable_sqlite"] = False
+            DB_CURSOR.execute('CREATE INDEX IF NOT EXISTS idx_MatchPlayerStats_MatchID ON MatchPlayerStats (MatchID)')
+            DB_CURSOR.execute('CREATE INDEX IF NOT EXISTS idx_MatchPlayerStats_PlayerID ON MatchPlayerStats (PlayerID)')
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS PlayerWatermarks (PlayerID TEXT PRIMARY KEY, NewestMatchID TEXT, UpdatedAt TEXT)')
+            # Materialized aggregates, maintained in the same transaction as each batch of match inserts
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS PlayerRelations (PlayerID TEXT, OtherPlayerID TEXT, OtherPlayerName TEXT, WithGames INTEGER DEFAULT 0, WithWins INTEGER DEFAULT 0, VsGames INTEGER DEFAULT 0, VsWins INTEGER DEFAULT 0, PRIMARY KEY (PlayerID, OtherPlayerID)) WITHOUT ROWID')
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS PlayerChampionStats (PlayerID TEXT, Champion TEXT, Games INTEGER DEFAULT 0, Wins INTEGER DEFAULT 0, Kills INTEGER DEFAULT 0, Deaths INTEGER DEFAULT 0, Assists INTEGER DEFAULT 0, KDASum REAL DEFAULT 0, DamageDealt INTEGER DEFAULT 0, DamageTaken INTEGER DEFAULT 0, Healing INTEGER DEFAULT 0, Shielding INTEGER DEFAULT 0, LevelSum INTEGER DEFAULT 0, PRIMARY KEY (PlayerID, Champion)) WITHOUT ROWID')
+            # Crawl frontier: discovered matches with pending/claimed/done/failed state and claim leases, plus history scan progress
+            DB_CURSOR.execute("CREATE TABLE IF NOT EXISTS CrawlFrontier (MatchID TEXT PRIMARY KEY, State TEXT NOT NULL DEFAULT 'pending', Attempts INTEGER DEFAULT 0, ClaimedBy TEXT, LeaseExpires REAL, UpdatedAt TEXT)")
+            DB_CURSOR.execute('CREATE INDEX IF NOT EXISTS idx_CrawlFrontier_State ON CrawlFrontier (State, LeaseExpires)')
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS FrontierMembers (PlayerID TEXT, MatchID TEXT, PRIMARY KEY (PlayerID, MatchID)) WITHOUT ROWID')
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS SnowballVisits (PlayerID TEXT PRIMARY KEY, VisitedAt TEXT)')
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS FrontierScans (PlayerID TEXT PRIMARY KEY, NextPage INTEGER, Complete INTEGER, UpdatedAt TEXT)')
+            DB_CURSOR.execute('CREATE TABLE IF NOT EXISTS PlayerMapStats (PlayerID TEXT, MapName TEXT, Games INTEGER DEFAULT 0, Wins INTEGER DEFAULT 0, KDASum REAL DEFAULT 0, DamageDealt INTEGER DEFAULT 0, Healing INTEGER DEFAULT 0, PRIMARY KEY (PlayerID, MapName)) WITHOUT ROWID')
+            DB_CONN.commit(); log.info(f"{Fore.GREEN}SQLite tables verified/created.{Style.RESET_ALL}")
+        except sqlite3.Error as e: log.error(f"{Fore.RED}Error initializing SQLite with {db_name}: {e}{Style.RESET_ALL}"); DB_CFG["enable_sqlite"] = False
 def close_sqlite():
+    global DB_CONN, DB_CURSOR
     if DB_CONN:
-        try: DB_CONN.close(); logging.info(f"{Fore.GREEN}SQLite connection closed.{Style.RESET_ALL}")
-        except sqlite3.Error as e: logging.error(f"{Fore.RED}Error closing SQLite connection: {e}{Style.RESET_ALL}")
+        flush_sqlite_writes()
+        try: DB_CONN.close(); log.info(f"{Fore.GREEN}SQLite connection closed.{Style.RESET_ALL}")
+        except sqlite3.Error as e: log.error(f"{Fore.RED}Error closing SQLite connection: {e}{Style.RESET_ALL}")
+        DB_CONN = DB_CURSOR = None
 def save_match_data_to_sqlite(match_id, map_name, match_datetime, players_data):
+    """Queues a match for the next batched write; flushes automatically once WRITE_BATCH_SIZE matches are pending."""
+    if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: return
+    PENDING_MATCH_ROWS.append((match_id, map_name, match_datetime.isoformat() if match_datetime else None)); PENDING_MATCH_IDS.add(match_id)
+    PENDING_MATCH_PLAYERS.append((match_id, map_name, players_data))
+    PENDING_PLAYER_ROWS.extend((p_data.get('MatchID'), p_data.get('PlayerID','NO_ID'), p_data.get('PlayerName','Unknown'), p_data.get('Champion','Unknown'), p_data.get('TeamIdx'), 1 if p_data.get('WonMatch') else 0, p_data.get('Level',0), p_data.get('Kills',0), p_data.get('Deaths',0), p_data.get('Assists',0), p_data.get('KDA',0.0), p_data.get('Credits',0), p_data.get('CPM',0), p_data.get('DamageDealt',0), p_data.get('DamageTaken',0), p_data.get('Shielding',0), p_data.get('Healing',0)) for p_data in players_data)
+    log.debug(f"Match data for {match_id} queued for SQLite ({len(PENDING_MATCH_ROWS)}/{WRITE_BATCH_SIZE}).")
+    if len(PENDING_MATCH_ROWS) >= WRITE_BATCH_SIZE: flush_sqlite_writes()
+def flush_sqlite_writes():
+    """
+    Writes every queued match and player row with executemany inside a single transaction. The queue is only
+    cleared once the transaction committed; returns False (queue kept) if it failed.
+    """
+    if not PENDING_MATCH_ROWS or not DB_CONN: return
+    n_matches, n_rows = len(PENDING_MATCH_ROWS), len(PENDING_PLAYER_ROWS)
+    try:
+        with METRICS.timer("sqlite_flush"), DB_CONN:
+            # Matches already stored (forced re-analysis) must not be counted twice in the aggregate tables
+            existing = set()
+            for start in range(0, n_matches, 500):
+                chunk = [row[0] for row in PENDING_MATCH_ROWS[start:start + 500]]
+                existing.update(r[0] for r in DB_CURSOR.execute(f"SELECT MatchID FROM Matches WHERE MatchID IN ({', '.join('?' * len(chunk))})", chunk))
+            DB_CURSOR.executemany("INSERT OR IGNORE INTO Matches (MatchID, MapName, MatchDateTime) VALUES (?, ?, ?)", PENDING_MATCH_ROWS)
+            # Outside forced re-analysis a stored match only comes back when another worker fetched it too (expired lease): keep one copy
+            player_rows = PENDING_PLAYER_ROWS if DB_CFG.get("force_full_reanalysis") or not existing else [row for row in PENDING_PLAYER_ROWS if row[0] not in existing]
+            DB_CURSOR.executemany(f"INSERT INTO MatchPlayerStats ({', '.join(PLAYER_STATS_COLUMNS)}) VALUES ({', '.join('?' * len(PLAYER_STATS_COLUMNS))})", player_rows)
+            new_matches, seen = [], set(existing)
+            for match in PENDING_MATCH_PLAYERS:
+                if match[0] not in seen: seen.add(match[0]); new_matches.append(match)
+            apply_aggregate_deltas(compute_aggregate_deltas(new_matches))
+        METRICS.inc("sqlite_matches_written", n_matches); METRICS.inc("sqlite_rows_written", n_rows)
+        log.debug(f"Flushed {n_matches} matches ({n_rows} player rows) to SQLite.")
+    except sqlite3.Error as e:
+        # The transaction was rolled back: keep the queue so the next flush retries it (e.g. "database is locked" under other workers)
+        log.error(f"{Fore.RED}Error saving batch of {n_matches} matches to SQLite: {e}. Kept queued for the next flush.{Style.RESET_ALL}"); return False
+    PENDING_MATCH_ROWS.clear(); PENDING_PLAYER_ROWS.clear(); PENDING_MATCH_IDS.clear(); PENDING_MATCH_PLAYERS.clear()
+    return True
+def is_real_player_id(pid): return bool(pid) and pid not in ("NO_ID", "ERROR")
+def compute_aggregate_deltas(matches):
+    """Sums (match_id, map_name, players_data) tuples into per-(player, other), (player, champion) and (player, map) deltas."""
+    relations = defaultdict(lambda: ['', 0, 0, 0, 0])
+    champions, maps = defaultdict(lambda: [0] * 11), defaultdict(lambda: [0] * 5)
+    for _, map_name, players_data in matches:
+        players = [p for p in players_data if is_real_player_id(p.get('PlayerID'))]
+        for p in players:
+            pid, won = p['PlayerID'], 1 if p.get('WonMatch') else 0
+            for o in players:
+                if o['PlayerID'] == pid: continue
+                rel = relations[(pid, o['PlayerID'])]; rel[0] = o.get('PlayerName', 'Unknown')
+                if o.get('TeamIdx') == p.get('TeamIdx'): rel[1] += 1; rel[2] += won
+                else: rel[3] += 1; rel[4] += won
+            ch = champions[(pid, p.get('Champion', 'Unknown'))]
+            for i, v in enumerate((1, won, p.get('Kills', 0), p.get('Deaths', 0), p.get('Assists', 0), p.get('KDA', 0.0), p.get('DamageDealt', 0), p.get('DamageTaken', 0), p.get('Healing', 0), p.get('Shielding', 0), p.get('Level', 0))): ch[i] += v
+            mp = maps[(pid, map_name)]
+            for i, v in enumerate((1, won, p.get('KDA', 0.0), p.get('DamageDealt', 0), p.get('Healing', 0))): mp[i] += v
+    return relations, champions, maps
+def apply_aggregate_deltas(deltas):
+    relations, champions, maps = deltas
+    DB_CURSOR.executemany('''INSERT INTO PlayerRelations (PlayerID, OtherPlayerID, OtherPlayerName, WithGames, WithWins, VsGames, VsWins) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (PlayerID, OtherPlayerID) DO UPDATE SET OtherPlayerName=excluded.OtherPlayerName, WithGames=WithGames+excluded.WithGames, WithWins=WithWins+excluded.WithWins, VsGames=VsGames+excluded.VsGames, VsWins=VsWins+excluded.VsWins''', [k + tuple(v) for k, v in relations.items()])
+    DB_CURSOR.executemany('''INSERT INTO PlayerChampionStats (PlayerID, Champion, Games, Wins, Kills, Deaths, Assists, KDASum, DamageDealt, DamageTaken, Healing, Shielding, LevelSum) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (PlayerID, Champion) DO UPDATE SET Games=Games+excluded.Games, Wins=Wins+excluded.Wins, Kills=Kills+excluded.Kills, Deaths=Deaths+excluded.Deaths, Assists=Assists+excluded.Assists, KDASum=KDASum+excluded.KDASum, DamageDealt=DamageDealt+excluded.DamageDealt, DamageTaken=DamageTaken+excluded.DamageTaken, Healing=Healing+excluded.Healing, Shielding=Shielding+excluded.Shielding, LevelSum=LevelSum+excluded.LevelSum''', [k + tuple(v) for k, v in champions.items()])
+    DB_CURSOR.executemany('''INSERT INTO PlayerMapStats (PlayerID, MapName, Games, Wins, KDASum, DamageDealt, Healing) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (PlayerID, MapName) DO UPDATE SET Games=Games+excluded.Games, Wins=Wins+excluded.Wins, KDASum=KDASum+excluded.KDASum, DamageDealt=DamageDealt+excluded.DamageDealt, Healing=Healing+excluded.Healing''', [k + tuple(v) for k, v in maps.items()])
+def rebuild_aggregate_tables():
+    """Recomputes every aggregate table from MatchPlayerStats (one row per match and player)."""
     if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: return
+    flush_sqlite_writes()
+    dedup = "WITH s AS (SELECT mps.*, m.MapName FROM MatchPlayerStats mps JOIN Matches m ON m.MatchID = mps.MatchID WHERE mps.StatID IN (SELECT MIN(StatID) FROM MatchPlayerStats GROUP BY MatchID, PlayerID) AND mps.PlayerID NOT IN ('', 'NO_ID', 'ERROR'))"
     try:
-        DB_CURSOR.execute("INSERT OR IGNORE INTO Matches (MatchID, MapName, MatchDateTime) VALUES (?, ?, ?)", (match_id, map_name, match_datetime.isoformat() if match_datetime else None))
-        for p_data in players_data:
-            DB_CURSOR.execute('''INSERT INTO MatchPlayerStats (MatchID, PlayerID, PlayerName, Champion, TeamIdx, WonMatch, Level, Kills, Deaths, Assists, KDA, Credits, CPM, DamageDealt, DamageTaken, Shielding, Healing) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (p_data.get('MatchID'), p_data.get('PlayerID','NO_ID'), p_data.get('PlayerName','Unknown'), p_data.get('Champion','Unknown'), p_data.get('TeamIdx'), 1 if p_data.get('WonMatch') else 0, p_data.get('Level',0), p_data.get('Kills',0), p_data.get('Deaths',0), p_data.get('Assists',0), p_data.get('KDA',0.0), p_data.get('Credits',0), p_data.get('CPM',0), p_data.get('DamageDealt',0), p_data.get('DamageTaken',0), p_data.get('Shielding',0), p_data.get('Healing',0)))
-        DB_CONN.commit(); logging.debug(f"Match data for {match_id} saved to SQLite.")
-    except sqlite3.Error as e: logging.error(f"{Fore.RED}Error saving data to SQLite for match {match_id}: {e}{Style.RESET_ALL}")
+        with DB_CONN:
+            for table in ("PlayerRelations", "PlayerChampionStats", "PlayerMapStats"): DB_CURSOR.execute(f"DELETE FROM {table}")
+            # Bare b.PlayerName next to MAX(b.StatID): SQLite takes it from the newest row, i.e. the latest known name
+            DB_CURSOR.execute(f'''INSERT INTO PlayerRelations (PlayerID, OtherPlayerID, OtherPlayerName, WithGames, WithWins, VsGames, VsWins) {dedup}
+                SELECT PlayerID, OtherPlayerID, OtherPlayerName, WithGames, WithWins, VsGames, VsWins FROM (
+                    SELECT a.PlayerID, b.PlayerID AS OtherPlayerID, b.PlayerName AS OtherPlayerName, MAX(b.StatID),
+                           SUM(a.TeamIdx = b.TeamIdx) AS WithGames, SUM(a.TeamIdx = b.TeamIdx AND a.WonMatch) AS WithWins, SUM(a.TeamIdx <> b.TeamIdx) AS VsGames, SUM(a.TeamIdx <> b.TeamIdx AND a.WonMatch) AS VsWins
+                    FROM s a JOIN s b ON a.MatchID = b.MatchID AND a.PlayerID <> b.PlayerID GROUP BY a.PlayerID, b.PlayerID)''')
+            DB_CURSOR.execute(f'''INSERT INTO PlayerChampionStats (PlayerID, Champion, Games, Wins, Kills, Deaths, Assists, KDASum, DamageDealt, DamageTaken, Healing, Shielding, LevelSum) {dedup}
+                SELECT PlayerID, Champion, COUNT(*), SUM(WonMatch), SUM(Kills), SUM(Deaths), SUM(Assists), SUM(KDA), SUM(DamageDealt), SUM(DamageTaken), SUM(Healing), SUM(Shielding), SUM(Level) FROM s GROUP BY PlayerID, Champion''')
+            DB_CURSOR.execute(f'''INSERT INTO PlayerMapStats (PlayerID, MapName, Games, Wins, KDASum, DamageDealt, Healing) {dedup}
+                SELECT PlayerID, MapName, COUNT(*), SUM(WonMatch), SUM(KDA), SUM(DamageDealt), SUM(Healing) FROM s GROUP BY PlayerID, MapName''')
+        log.info(f"{Fore.GREEN}Aggregate tables rebuilt from MatchPlayerStats.{Style.RESET_ALL}")
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error rebuilding aggregate tables: {e}{Style.RESET_ALL}")
+def delete_match_from_sqlite(match_id):
+    if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: return
+    if match_id in PENDING_MATCH_IDS: flush_sqlite_writes()
+    try:
+        DB_CURSOR.execute("DELETE FROM MatchPlayerStats WHERE MatchID = ?", (match_id,))
+        DB_CURSOR.execute("DELETE FROM Matches WHERE MatchID = ?", (match_id,))
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error deleting match {match_id} from SQLite: {e}{Style.RESET_ALL}")
 def is_match_in_sqlite(match_id):
     if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: return False
+    if match_id in PENDING_MATCH_IDS: return True
     try: DB_CURSOR.execute("SELECT 1 FROM Matches WHERE MatchID = ?", (match_id,)); return DB_CURSOR.fetchone() is not None
-    except sqlite3.Error as e: logging.error(f"{Fore.RED}Error checking match in SQLite {match_id}: {e}{Style.RESET_ALL}"); return False
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error checking match in SQLite {match_id}: {e}{Style.RESET_ALL}"); return False
+def get_player_watermark(player_id):
+    """Newest match ID fully ingested for a player, or None if the player was never completely scanned."""
+    if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: return None
+    try: DB_CURSOR.execute("SELECT NewestMatchID FROM PlayerWatermarks WHERE PlayerID = ?", (str(player_id),)); row = DB_CURSOR.fetchone(); return row[0] if row else None
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error reading watermark for player {player_id}: {e}{Style.RESET_ALL}"); return None
+def set_player_watermark(player_id, match_id):
+    if not DB_CFG.get("enable_sqlite") or not DB_CURSOR or not match_id: return
+    current = get_player_watermark(player_id)
+    if current and current.isdigit() and str(match_id).isdigit() and int(current) >= int(match_id): return
+    try:
+        with DB_CONN: DB_CURSOR.execute("INSERT OR REPLACE INTO PlayerWatermarks (PlayerID, NewestMatchID, UpdatedAt) VALUES (?, ?, ?)", (str(player_id), str(match_id), datetime.now().isoformat()))
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error saving watermark for player {player_id}: {e}{Style.RESET_ALL}")
+def matches_in_sqlite(match_ids, chunk_size=500, include_queued=True):
+    """Bulk variant of is_match_in_sqlite: returns the subset of match_ids already stored (or queued, unless include_queued is False)."""
+    if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: return set()
+    match_ids = list(dict.fromkeys(match_ids)); known = {m for m in match_ids if m in PENDING_MATCH_IDS} if include_queued else set()
+    try:
+        for start in range(0, len(match_ids), chunk_size):
+            chunk = match_ids[start:start + chunk_size]
+            DB_CURSOR.execute(f"SELECT MatchID FROM Matches WHERE MatchID IN ({', '.join('?' * len(chunk))})", chunk)
+            known.update(row[0] for row in DB_CURSOR.fetchall())
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error checking {len(match_ids)} matches in SQLite: {e}{Style.RESET_ALL}")
+    return known
+
+# --- CRAWL FRONTIER ---
+# Discovered match IDs live in CrawlFrontier until they are stored. Workers claim leased batches inside
+# BEGIN IMMEDIATE transactions, so processes sharing the database file never claim the same match twice;
+# a claim whose lease expired (crashed or killed worker) becomes claimable again.
+def frontier_add(player_id, match_ids, reset=False):
+    """
+    Adds newly discovered matches as 'pending' and links them to the player. Existing entries keep their
+    state, unless reset is set (force_full_reanalysis): then 'done' and 'failed' entries become 'pending' again.
+    """
+    if not DB_CONN or not match_ids: return
+    now = datetime.now().isoformat()
+    try:
+        with DB_CONN:
+            DB_CURSOR.executemany("INSERT OR IGNORE INTO CrawlFrontier (MatchID, State, Attempts, UpdatedAt) VALUES (?, 'pending', 0, ?)", [(m, now) for m in match_ids])
+            if reset: DB_CURSOR.executemany("UPDATE CrawlFrontier SET State = 'pending', Attempts = 0, ClaimedBy = NULL, LeaseExpires = NULL, UpdatedAt = ? WHERE MatchID = ? AND State IN ('done', 'failed')", [(now, m) for m in match_ids])
+            DB_CURSOR.executemany("INSERT OR IGNORE INTO FrontierMembers (PlayerID, MatchID) VALUES (?, ?)", [(str(player_id), m) for m in match_ids])
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error adding {len(match_ids)} matches to the crawl frontier: {e}{Style.RESET_ALL}")
+def frontier_members(player_id, match_ids):
+    """Subset of match_ids already queued in the crawl frontier for this player (in any state)."""
+    if not DB_CONN or not match_ids: return set()
+    match_ids = list(dict.fromkeys(match_ids))
+    try: return {row[0] for row in DB_CONN.execute(f"SELECT MatchID FROM FrontierMembers WHERE PlayerID = ? AND MatchID IN ({', '.join('?' * len(match_ids))})", [str(player_id)] + match_ids)}
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error reading crawl frontier members of player {player_id}: {e}{Style.RESET_ALL}"); return set()
+def get_frontier_scan(player_id):
+    """(next_page, complete) of the player's last history scan, or None if it was never scanned with the frontier."""
+    if not DB_CONN: return None
+    try: row = DB_CONN.execute("SELECT NextPage, Complete FROM FrontierScans WHERE PlayerID = ?", (str(player_id),)).fetchone(); return (row[0], bool(row[1])) if row else None
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error reading scan progress for player {player_id}: {e}{Style.RESET_ALL}"); return None
+def set_frontier_scan(player_id, next_page, complete):
+    if not DB_CONN: return
+    try:
+        with DB_CONN: DB_CURSOR.execute("INSERT OR REPLACE INTO FrontierScans (PlayerID, NextPage, Complete, UpdatedAt) VALUES (?, ?, ?, ?)", (str(player_id), next_page, 1 if complete else 0, datetime.now().isoformat()))
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error saving scan progress for player {player_id}: {e}{Style.RESET_ALL}")
+def claim_frontier_batch(player_ids=None, limit=None):
+    """
+    Claims up to `limit` (default: claim_batch_size) pending or lease-expired matches, newest first, for WORKER_ID and
+    returns their IDs. player_ids restricts the claim to matches found in those players' histories; None claims from the whole frontier.
+    """
+    if not DB_CONN: return []
+    now, limit = time.time(), limit or FRONTIER_BATCH
+    member_filter = f"AND MatchID IN (SELECT MatchID FROM FrontierMembers WHERE PlayerID IN ({', '.join('?' * len(player_ids))}))" if player_ids else ""
+    try:
+        if DB_CONN.in_transaction: DB_CONN.commit()
+        DB_CURSOR.execute("BEGIN IMMEDIATE")  # takes the write lock before reading, so concurrent claimers serialize here
+        try:
+            DB_CURSOR.execute(f"SELECT MatchID FROM CrawlFrontier WHERE (State = 'pending' OR (State = 'claimed' AND LeaseExpires < ?)) {member_filter} ORDER BY CAST(MatchID AS INTEGER) DESC LIMIT ?",
+                              [now] + [str(p) for p in player_ids or []] + [limit])
+            claimed = [row[0] for row in DB_CURSOR.fetchall()]
+            DB_CURSOR.executemany("UPDATE CrawlFrontier SET State = 'claimed', ClaimedBy = ?, LeaseExpires = ?, UpdatedAt = ? WHERE MatchID = ?",
+                                  [(WORKER_ID, now + FRONTIER_LEASE_SEC, datetime.now().isoformat(), m) for m in claimed])
+            DB_CONN.commit()
+        except BaseException: DB_CONN.rollback(); raise
+        return claimed
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error claiming matches from the crawl frontier: {e}{Style.RESET_ALL}"); return []
+def finish_frontier_batch(match_ids, interrupted=False):
+    """
+    Marks stored matches 'done'. The rest count as a failed attempt ('failed' after max_attempts, 'pending' before),
+    or, when the batch was interrupted, simply go back to 'pending'. Call after flush_sqlite_writes().
+    """
+    if not DB_CONN or not match_ids: return
+    stored, now = matches_in_sqlite(match_ids, include_queued=False), datetime.now().isoformat()  # a match still queued after a failed flush is not done
+    rest = [m for m in match_ids if m not in stored]
+    try:
+        with DB_CONN:
+            DB_CURSOR.executemany("UPDATE CrawlFrontier SET State = 'done', ClaimedBy = NULL, LeaseExpires = NULL, UpdatedAt = ? WHERE MatchID = ?", [(now, m) for m in stored])
+            if interrupted: DB_CURSOR.executemany("UPDATE CrawlFrontier SET State = 'pending', ClaimedBy = NULL, LeaseExpires = NULL, UpdatedAt = ? WHERE MatchID = ? AND State = 'claimed' AND ClaimedBy = ?", [(now, m, WORKER_ID) for m in rest])
+            else: DB_CURSOR.executemany("UPDATE CrawlFrontier SET Attempts = Attempts + 1, State = CASE WHEN Attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, ClaimedBy = NULL, LeaseExpires = NULL, UpdatedAt = ? WHERE MatchID = ? AND State = 'claimed' AND ClaimedBy = ?",
+                                        [(FRONTIER_MAX_ATTEMPTS, now, m, WORKER_ID) for m in rest])
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error updating {len(match_ids)} crawl frontier entries: {e}{Style.RESET_ALL}")
+def release_frontier_claims():
+    """Hands this worker's open claims back (stored ones become 'done') so an interrupted run does not wait for its leases to expire."""
+    if not DB_CONN: return
+    flush_sqlite_writes()
+    try: claimed = [row[0] for row in DB_CONN.execute("SELECT MatchID FROM CrawlFrontier WHERE State = 'claimed' AND ClaimedBy = ?", (WORKER_ID,))]
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error reading open frontier claims: {e}{Style.RESET_ALL}"); return
+    if claimed: finish_frontier_batch(claimed, interrupted=True); log.info(f"{Fore.YELLOW}Released {len(claimed)} unfinished frontier claims.{Style.RESET_ALL}")
+def frontier_counts(player_ids=None):
+    """{state: count} over the whole frontier, or over the matches of the given players."""
+    if not DB_CONN: return {}
+    member_filter = f"WHERE MatchID IN (SELECT MatchID FROM FrontierMembers WHERE PlayerID IN ({', '.join('?' * len(player_ids))}))" if player_ids else ""
+    try: return dict(DB_CONN.execute(f"SELECT State, COUNT(*) FROM CrawlFrontier {member_filter} GROUP BY State", [str(p) for p in player_ids or []]).fetchall())
+    except sqlite3.Error as e: log.error(f"{Fore.RED}Error counting crawl frontier entries: {e}{Style.RESET_ALL}"); return {}
+
+# --- RATE LIMITING ---
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst` tokens."""
+    def __init__(self, rate, burst=1):
+        self.rate, self.capacity = float(rate), max(1.0, float(burst))
+        self.tokens, self.last = self.capacity, time.monotonic()
+        self.lock = threading.Lock()
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate); self.last = now
+    def set_rate(self, rate):
+        with self.lock: self._refill(); self.rate = float(rate)
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1: self.tokens -= 1; return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+class HostRateLimiter:
+    """One shared TokenBucket per host, so every worker thread draws from the same request budget."""
+    def __init__(self, rate, burst=1):
+        self.rate, self.burst = rate, burst
+        self.buckets, self.lock = {}, threading.Lock()
+    def _bucket(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None: bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
+    def acquire(self, url):
+        self._bucket(urlparse(url).netloc).acquire()
+
+class AdaptiveRateLimiter(HostRateLimiter):
+    """
+    HostRateLimiter whose per-host rate follows AIMD: every healthy response adds `increase_step / rate`
+    (so the rate grows by about `increase_step` req/s per second of clean traffic), every 429, timeout or
+    5xx multiplies it by `decrease_factor`; it always stays within [min_rate, max_rate]. A Retry-After
+    header pauses the host until that time; without one, the reduced rate alone paces the next requests. `circuit_threshold` consecutive failures open a circuit
+    breaker: nothing is sent to the host for `circuit_cooldown` seconds, then a single probe request is
+    let through (half-open). A successful probe closes the circuit, a failed one reopens it for twice as long.
+    """
+    def __init__(self, rate, burst=1, min_rate=0.2, max_rate=5.0, increase_step=0.05, decrease_factor=0.5,
+                 circuit_threshold=5, circuit_cooldown=60, max_retry_after=300, log_interval=30):
+        self.min_rate, self.max_rate = float(min_rate), float(max(max_rate, min_rate))
+        super().__init__(min(max(float(rate or self.max_rate), self.min_rate), self.max_rate), burst)
+        self.increase_step, self.decrease_factor = float(increase_step), float(decrease_factor)
+        self.circuit_threshold, self.circuit_cooldown, self.max_retry_after = max(1, int(circuit_threshold)), float(circuit_cooldown), float(max_retry_after)
+        self.log_interval, self.hosts = log_interval, {}
+    def _state(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = {'blocked_until': 0.0, 'failures': 0, 'circuit': 'closed', 'cooldown': self.circuit_cooldown,
+                                            'probe_in_flight': False, 'last_log': time.monotonic(), 'ok': 0, 'throttled': 0}
+            return state
+    def acquire(self, url):
+        host = urlparse(url).netloc; state = self._state(host)
+        while True:
+            with self.lock:
+                wait = state['blocked_until'] - time.monotonic()
+                if wait <= 0 and state['circuit'] == 'open':
+                    state['circuit'] = 'half-open'
+                    log.info(f"{Fore.YELLOW}[RATE] {host}: circuit half-open, sending one probe request.{Style.RESET_ALL}")
+                if wait <= 0 and state['circuit'] == 'half-open':
+                    if state['probe_in_flight']: wait = 0.5
+                    else: state['probe_in_flight'] = True
+            if wait <= 0: break
+            time.sleep(min(wait, 5.0))
+        self._bucket(host).acquire()
+    def _set_rate(self, host, rate):
+        bucket = self._bucket(host)
+        rate = min(max(rate, self.min_rate), self.max_rate); bucket.set_rate(rate)
+        METRICS.gauge("request_rate_per_sec", round(rate, 3))
+        return rate
+    def on_success(self, url):
+        host = urlparse(url).netloc; state, bucket = self._state(host), self._bucket(host)
+        rate = self._set_rate(host, bucket.rate + self.increase_step / bucket.rate)
+        with self.lock:
+            state['failures'], state['ok'] = 0, state['ok'] + 1
+            if state['circuit'] != 'closed':
+                state['circuit'], state['probe_in_flight'], state['cooldown'] = 'closed', False, self.circuit_cooldown
+                log.info(f"{Fore.GREEN}[RATE] {host}: probe succeeded, circuit closed ({rate:.2f} req/s).{Style.RESET_ALL}")
+            now = time.monotonic()
+            if now - state['last_log'] >= self.log_interval:
+                state['last_log'] = now
+                log.info(f"{Fore.CYAN}[RATE] {host}: {rate:.2f} req/s ({state['ok']} ok, {state['throttled']} throttled/failed so far).{Style.RESET_ALL}")
+    def on_failure(self, url, retry_after=None, reason="error"):
+        """Multiplicative decrease after a 429 (`retry_after` seconds from its header, if any), timeout or 5xx."""
+        host = urlparse(url).netloc; state, bucket = self._state(host), self._bucket(host)
+        rate = self._set_rate(host, bucket.rate * self.decrease_factor)
+        with self.lock:
+            now = time.monotonic()
+            state['failures'] += 1; state['throttled'] += 1
+            pause = min(retry_after, self.max_retry_after) if retry_after is not None else 0.0
+            if state['circuit'] == 'half-open':
+                state['cooldown'] = min(state['cooldown'] * 2, 600.0); state['circuit'], state['probe_in_flight'] = 'open', False
+                pause = max(pause, state['cooldown'])
+                log.warning(f"{Fore.RED}[RATE] {host}: probe failed ({reason}), circuit reopened for {pause:.0f}s.{Style.RESET_ALL}")
+            elif state['circuit'] == 'closed' and state['failures'] >= self.circuit_threshold:
+                state['circuit'] = 'open'; pause = max(pause, state['cooldown']); METRICS.inc("circuit_breaker_trips")
+                log.warning(f"{Fore.RED}[RATE] {host}: {state['failures']} consecutive failures, circuit open for {pause:.0f}s.{Style.RESET_ALL}")
+            else: log.warning(f"{Fore.YELLOW}[RATE] {host}: {reason}, rate cut to {rate:.2f} req/s" + (f", pausing {pause:.0f}s (Retry-After)" if retry_after is not None else "") + f".{Style.RESET_ALL}")
+            state['blocked_until'] = max(state['blocked_until'], now + pause)
+
+# --- HTTP SESSION POOL ---
+class SessionPool:
+    """
+    Keeps idle curl_cffi sessions per impersonation target so keep-alive connections (and their TLS
+    handshakes) are reused across history and match pages. A session is only ever used by one thread
+    at a time: acquire() hands it out exclusively and release() puts it back.
+    """
+    def __init__(self, max_idle_per_target=4, idle_timeout=60):
+        self.max_idle, self.idle_timeout = max_idle_per_target, idle_timeout
+        self.idle, self.lock = defaultdict(list), threading.Lock()
+        self.last_conn = {}
+        self.stats = {'sessions_created': 0, 'sessions_reused': 0, 'sessions_expired': 0, 'sessions_discarded': 0, 'connections_opened': 0, 'connections_reused': 0}
+    def acquire(self, target):
+        expired = []
+        with self.lock:
+            idle, now = self.idle[target], time.monotonic()
+            while idle:
+                session, last_used = idle.pop()
+                if self.idle_timeout is None or now - last_used <= self.idle_timeout:
+                    self.stats['sessions_reused'] += 1; break
+                expired.append(session); self.stats['sessions_expired'] += 1
+            else:
+                session = None; self.stats['sessions_created'] += 1
+        for old in expired: self._close(old)
+        if session: return session
+        from curl_cffi import requests
+        # One curl handle per session (not per thread), otherwise the keep-alive cache is lost when a session changes threads.
+        return requests.Session(impersonate=target, headers=HEADERS, timeout=60, use_thread_local_curl=False)
+    def record_response(self, session, response):
+        # primary_ip/primary_port/local_port only exist in newer curl_cffi releases; older ones skip the reuse accounting
+        conn = tuple(getattr(response, name, None) for name in ('primary_ip', 'primary_port', 'local_port'))
+        if None in conn: return
+        with self.lock:
+            reused = self.last_conn.get(id(session)) == conn
+            self.stats['connections_reused' if reused else 'connections_opened'] += 1
+            self.last_conn[id(session)] = conn
+    def release(self, target, session, healthy=True):
+        with self.lock:
+            if healthy and len(self.idle[target]) < self.max_idle: self.idle[target].append((session, time.monotonic())); return
+            self.stats['sessions_discarded'] += 1
+        self._close(session)
+    def _close(self, session):
+        with self.lock: self.last_conn.pop(id(session), None)
+        try: session.close()
+        except Exception as e: log.debug(f"Error closing HTTP session: {e}")
+    def close_all(self):
+        with self.lock: sessions = [s for idle in self.idle.values() for s, _ in idle]; self.idle.clear()
+        for session in sessions: self._close(session)
+    def log_stats(self):
+        st = self.stats; total = st['connections_opened'] + st['connections_reused']
+        if total: log.info(f"{Fore.CYAN}HTTP pool: {total} requests, {st['connections_reused']} on reused connections, {st['connections_opened']} new connections ({st['sessions_created']} sessions created, {st['sessions_expired']} expired, {st['sessions_discarded']} discarded).{Style.RESET_ALL}")
+
+def close_http_pool():
+    HTTP_POOL.log_stats(); HTTP_POOL.close_all()
+
+# --- RAW HTML CACHE ---
+class HtmlCache:
+    """
+    Content-addressed store of fetched pages: the file name is the SHA-256 of the URL and the payload is a
+    one-line JSON header ({"url", "fetched_at"}) followed by the HTML, compressed with zstd or gzip.
+    Match pages never expire; history pages expire after `history_ttl` seconds.
+    """
+    EXTENSIONS = {'zstd': '.html.zst', 'gzip': '.html.gz'}
+    def __init__(self, cache_dir, compression="gzip", history_ttl=3600):
+        try: import zstandard
+        except ImportError: zstandard = None
+        self.zstd = zstandard
+        if compression == "zstd" and zstandard is None:
+            log.warning(f"{Fore.YELLOW}[CACHE] 'zstandard' is not installed. Falling back to gzip compression.{Style.RESET_ALL}"); compression = "gzip"
+        self.cache_dir, self.compression, self.history_ttl = cache_dir, compression if compression in self.EXTENSIONS else "gzip", history_ttl
+    def _path(self, url, compression):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + self.EXTENSIONS[compression])
+    def _decode(self, path):
+        with open(path, 'rb') as f: raw = f.read()
+        if path.endswith(self.EXTENSIONS['zstd']):
+            if self.zstd is None: return None
+            raw = self.zstd.ZstdDecompressor().decompress(raw)
+        else: raw = gzip.decompress(raw)
+        header, _, body = raw.decode('utf-8').partition("\n")
+        meta = json.loads(header)
+        return meta['url'], body, datetime.fromisoformat(meta['fetched_at'])
+    def _read_header(self, path):
+        """(url, fetched_at) of an entry, decompressing only up to the end of its header line."""
+        with open(path, 'rb') as f:
+            if path.endswith(self.EXTENSIONS['zstd']):
+                if self.zstd is None: return None
+                stream = self.zstd.ZstdDecompressor().stream_reader(f)
+            else: stream = gzip.GzipFile(fileobj=f)
+            head = b""
+            while b"\n" not in head:
+                chunk = stream.read(4096)
+                if not chunk: break
+                head += chunk
+        meta = json.loads(head.partition(b"\n")[0].decode('utf-8'))
+        return meta['url'], datetime.fromisoformat(meta['fetched_at'])
+    def get(self, url, ttl=None):
+        for compression in (self.compression, *(c for c in self.EXTENSIONS if c != self.compression)):
+            path = self._path(url, compression)
+            if not os.path.exists(path): continue
+            try: _, body, fetched_at = self._decode(path) or (None, None, None)
+            except (OSError, ValueError, KeyError) as e: log.warning(f"{Fore.YELLOW}[CACHE] Corrupt entry for {url}: {e}{Style.RESET_ALL}"); continue
+            if body is None or (ttl is not None and (datetime.now() - fetched_at).total_seconds() > ttl): continue
+            return body, fetched_at
+        return None
+    def put(self, url, html, fetched_at):
+        path = self._path(url, self.compression)
+        raw = (json.dumps({'url': url, 'fetched_at': fetched_at.isoformat()}) + "\n" + html).encode('utf-8')
+        data = self.zstd.ZstdCompressor(level=10).compress(raw) if self.compression == "zstd" else gzip.compress(raw, compresslevel=6)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f: f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e: log.error(f"{Fore.RED}[CACHE] Could not write entry for {url}: {e}{Style.RESET_ALL}")
+    def _entry_paths(self):
+        if not os.path.isdir(self.cache_dir): return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(tuple(self.EXTENSIONS.values())): yield os.path.join(root, name)
+    def iter_entries(self):
+        """Yields (url, html, fetched_at) for every readable cache entry, one entry in memory at a time."""
+        for path in self._entry_paths():
+            entry = self.load(path)
+            if entry: yield entry
+    def iter_index(self):
+        """Yields (url, fetched_at, path) for every readable cache entry without loading its HTML (see load)."""
+        for path in self._entry_paths():
+            try: header = self._read_header(path)
+            except (OSError, ValueError, KeyError) as e: log.warning(f"{Fore.YELLOW}[CACHE] Skipping unreadable entry {os.path.basename(path)}: {e}{Style.RESET_ALL}"); continue
+            if header: yield header + (path,)
+    def load(self, path):
+        """(url, html, fetched_at) of one cache entry, or None if it cannot be read."""
+        try: return self._decode(path)
+        except (OSError, ValueError, KeyError) as e: log.warning(f"{Fore.YELLOW}[CACHE] Skipping unreadable entry {os.path.basename(path)}: {e}{Style.RESET_ALL}"); return None
+
 
 # --- HELPER FUNCTIONS ---
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value: return None
+    try: return max(0.0, float(value))
+    except ValueError: pass
+    try: return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError, IndexError): return None
+
 def safe_get_request(url, retries=3, delay_on_retry=10):
     """
     Performs a GET request with retries, rotating browser impersonation to avoid detection/blocking.
     Uses increased timeouts to handle slow responses or connection issues.
+    Every attempt first takes a token from the shared per-host rate limiter. With adaptive_rate the limiter
+    also owns the backoff (AIMD, Retry-After, circuit breaker); otherwise retries wait delay_on_retry * attempt.
     """
+    from curl_cffi import requests
+    adaptive = isinstance(RATE_LIMITER, AdaptiveRateLimiter)
     for attempt in range(retries):
         try:
+            if RATE_LIMITER:
+                with METRICS.timer("rate_limit_wait"): RATE_LIMITER.acquire(url)
             # Rotate impersonation target for each attempt to reduce chance of blocking
             impersonate_target = random.choice(IMPERSONATE_TARGETS)
-            logging.debug(f"Attempt {attempt+1}/{retries} using impersonation: {impersonate_target}")
-
-            # Increased timeout to 60 seconds
-            response = requests.get(
-                url,
-                headers=HEADERS,
-                timeout=60,
-                impersonate=impersonate_target
-            )
+            log.debug(f"Attempt {attempt+1}/{retries} using impersonation: {impersonate_target}")
+
+            # Pooled session for this impersonation target (keep-alive); timeout stays at 60 seconds
+            session, healthy = HTTP_POOL.acquire(impersonate_target), False
+            try:
+                METRICS.inc("http_requests")
+                with METRICS.timer("http_request"): response = session.get(url, headers=HEADERS, timeout=60)
+                HTTP_POOL.record_response(session, response); healthy = True
+            finally: HTTP_POOL.release(impersonate_target, session, healthy)
             response.raise_for_status()
+            if adaptive: RATE_LIMITER.on_success(url)
             return response
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 429:
-                wait_time = delay_on_retry * (attempt + 1)
-                logging.warning(f"{Fore.YELLOW}HTTP 429: Too Many Requests. Waiting {wait_time}s...{Style.RESET_ALL}")
-                time.sleep(wait_time)
+                METRICS.inc("http_429")
+                if adaptive: RATE_LIMITER.on_failure(url, parse_retry_after(e.response.headers.get('Retry-After')), "HTTP 429")
+                else:
+                    wait_time = delay_on_retry * (attempt + 1)
+                    log.warning(f"{Fore.YELLOW}HTTP 429: Too Many Requests. Waiting {wait_time}s...{Style.RESET_ALL}")
+                    METRICS.sleep("backoff_sleep", wait_time)
             else:
-                logging.error(f"{Fore.RED}HTTP {e.response.status_code}: {url}. Will not retry.{Style.RESET_ALL}")
+                METRICS.inc("http_errors")
+                # The server answered: only 5xx means it is struggling, a 404 says nothing about the request rate
+                if adaptive: RATE_LIMITER.on_failure(url, reason=f"HTTP {e.response.status_code}") if e.response.status_code >= 500 else RATE_LIMITER.on_success(url)
+                log.error(f"{Fore.RED}HTTP {e.response.status_code}: {url}. Will not retry.{Style.RESET_ALL}")
                 return None
         except requests.exceptions.RequestException as e:
             # Catch timeouts and other connection errors
-            logging.error(f"{Fore.RED}Network/Connection Error: {e} at {url}{Style.RESET_ALL}")
+            METRICS.inc("http_errors")
+            if adaptive: RATE_LIMITER.on_failure(url, reason="connection error")
+            log.error(f"{Fore.RED}Network/Connection Error: {e} at {url}{Style.RESET_ALL}")
 
         # If we are here, an exception occurred (but not a fatal HTTP error)
         if attempt < retries - 1:
+            METRICS.inc("http_retries")
+            if adaptive: log.warning(f"{Fore.YELLOW}Retrying ({attempt+1}/{retries}) for {url} once the rate limiter allows it.{Style.RESET_ALL}"); continue
             wait_time = delay_on_retry * (attempt + 1)
-            logging.warning(f"{Fore.YELLOW}Retrying ({attempt+1}/{retries}) for {url} in {wait_time}s...{Style.RESET_ALL}")
-            time.sleep(wait_time)
+            log.warning(f"{Fore.YELLOW}Retrying ({attempt+1}/{retries}) for {url} in {wait_time}s...{Style.RESET_ALL}")
+            METRICS.sleep("backoff_sleep", wait_time)
 
-    logging.error(f"{Fore.RED}All retries failed for {url}{Style.RESET_ALL}")
+    METRICS.inc("http_failures")
+    log.error(f"{Fore.RED}All retries failed for {url}{Style.RESET_ALL}")
     return None
 
+def fetch_page_html(url, page_kind="match"):
+    """
+    Returns (html, fetched_at) for a page, served from HTML_CACHE when possible. History pages honour the
+    configured TTL; match pages are immutable and never expire. Returns (None, None) when the fetch fails.
+    A match page without its stats section ("Match is still processing") is neither cached nor served from
+    the cache, so the next run fetches it again.
+    """
+    if HTML_CACHE:
+        cached = HTML_CACHE.get(url, ttl=None if page_kind == "match" else HTML_CACHE.history_ttl)
+        if cached and page_kind == "match" and not MATCH_STATS_SECTION_RE.search(cached[0]): cached = None  # written by an older version
+        if cached: METRICS.inc("cache_hits"); log.debug(f"Cache hit: {url}"); return cached
+        METRICS.inc("cache_misses")
+    with METRICS.timer(f"{page_kind}_fetch"): response = safe_get_request(url)
+    if not response: return None, None
+    fetched_at = datetime.now()
+    if HTML_CACHE and (page_kind != "match" or MATCH_STATS_SECTION_RE.search(response.text)): HTML_CACHE.put(url, response.text, fetched_at)
+    return response.text, fetched_at
+
 def extract_player_id_from_href(href):
     if not href: return ""
     match = re.search(r'/profile/(\d+)-', href); return match.group(1) if match else ""
 def parse_stat_value(text_value):
     if not text_value: return 0
     cleaned = text_value.strip().replace(".", "").replace(",", ""); return int(cleaned) if cleaned.isdigit() else 0
-def parse_relative_time(time_str):
+def parse_relative_time(time_str, now=None):
     if not time_str or "ago" not in time_str.lower(): return None
-    now = datetime.now(); time_str = time_str.lower().replace(" ago", "").strip()
+    now = now or datetime.now(); time_str = time_str.lower().replace(" ago", "").strip()
     try:
         val_match = re.search(r'(\d+)', time_str)
         val = int(val_match.group(1)) if val_match else 1
@@ -194,112 +885,159 @@ def parse_relative_time(time_str):
         }
         for unit, delta in deltas.items():
             if unit in time_str: return now - delta
-    except Exception as e: logging.error(f"{Fore.RED}Error parsing relative time '{time_str}': {e}{Style.RESET_ALL}"); return None
+    except Exception as e: log.error(f"{Fore.RED}Error parsing relative time '{time_str}': {e}{Style.RESET_ALL}"); return None
     return None
 def extract_info_from_url(url):
     match = re.search(r'/profile/(\d+)-([^/?]+)', url)
     if match:
         player_id, player_name = match.group(1), match.group(2)
-        logging.info(f"{Fore.GREEN}Profile URL detected. Analyzing: {player_name} (ID: {player_id}){Style.RESET_ALL}")
+        log.info(f"{Fore.GREEN}Profile URL detected. Analyzing: {player_name} (ID: {player_id}){Style.RESET_ALL}")
         return player_name, player_id
-    logging.error(f"{Fore.RED}Invalid URL format. Example: https://paladins.guru/profile/123456-PlayerName{Style.RESET_ALL}"); return None, None
+    log.error(f"{Fore.RED}Invalid URL format. Example: https://paladins.guru/profile/123456-PlayerName{Style.RESET_ALL}"); return None, None
 def parse_player_stats_from_row(row_el, table_type):
-    p_name, p_id, champ = "UnknownPlayer", "NO_ID", "UnknownChamp"
-    stats = {}
+    return build_player_stats(extract_row_fields_bs4(row_el), table_type)
+def extract_row_fields_bs4(row_el):
+    """Raw (name, href, champion alt, [direct row__item texts]) of a BeautifulSoup scoreboard row, or None."""
     info_el = row_el.select_one(PLAYER_INFO_CONTAINER_SELECTOR)
-    if not info_el: return None, None
+    if not info_el: return None
     name_el, champ_img = info_el.select_one(PLAYER_NAME_SELECTOR), info_el.select_one(PLAYER_CHAMP_IMG_SELECTOR)
-    if not (name_el and champ_img): return None, None
-    p_name, p_id, champ = name_el.text.strip(), extract_player_id_from_href(name_el.get('href')) or "NO_ID", champ_img.get('alt', "Unknown").strip()
+    if not (name_el and champ_img): return None
+    return name_el.text, name_el.get('href'), champ_img.get('alt', "Unknown"), [item.text for item in row_el.find_all('div', class_='row__item', recursive=False)]
+def build_player_stats(row_fields, table_type):
+    """Backend-independent part of row parsing: turns raw row fields into (player_key, stats)."""
+    if not row_fields: return None, None
+    stats = {}
+    name_text, href, champ_alt, item_texts = row_fields
+    p_name, p_id, champ = name_text.strip(), extract_player_id_from_href(href) or "NO_ID", champ_alt.strip()
     key = p_id if p_id != "NO_ID" else p_name.lower()
-    stat_items = [item for item in row_el.find_all('div', class_='row__item', recursive=False)]
     if table_type == "scoreboard":
-        if len(stat_items) < 7: return None, None
-        stats['Level'] = parse_stat_value(stat_items[0].text)
-        kda_parts = [p.strip() for p in stat_items[1].text.strip().split("/")]
+        if len(item_texts) < 7: return None, None
+        stats['Level'] = parse_stat_value(item_texts[0])
+        kda_parts = [p.strip() for p in item_texts[1].strip().split("/")]
         if len(kda_parts)==3 and all(p.isdigit() for p in kda_parts):
             stats['Kills'], stats['Deaths'], stats['Assists'] = int(kda_parts[0]), int(kda_parts[1]), int(kda_parts[2])
             stats['KDA'] = round((stats['Kills']+stats['Assists'])/max(stats['Deaths'], 1), 2)
-        stats['Credits'], stats['CPM'], stats['DamageDealt'], stats['DamageTaken'], stats['Shielding'] = (parse_stat_value(stat_items[i].text) for i in range(2, 7))
+        stats['Credits'], stats['CPM'], stats['DamageDealt'], stats['DamageTaken'], stats['Shielding'] = (parse_stat_value(item_texts[i]) for i in range(2, 7))
         stats['Champion'] = champ
         stats['PlayerName'] = p_name # Guardar el nombre original también
         stats['PlayerID'] = p_id
     elif table_type == "performance":
-        if len(stat_items) >= 3: stats['Healing'] = parse_stat_value(stat_items[2].text)
+        if len(item_texts) >= 3: stats['Healing'] = parse_stat_value(item_texts[2])
     return key, stats
 
-# --- CORE SCRAPING AND ANALYSIS FUNCTIONS ---
-def download_match_links_for_player(player_name, player_id):
-    base_url = PROFILE_URL_TEMPLATE.format(id=player_id, name=player_name.lower().replace(" ", "%20"))
-    all_urls = set()
-    current_page, max_pages = 1, MAX_PAGES_TO_SCAN_HISTORY if MAX_PAGES_TO_SCAN_HISTORY is not None else 50
-    logging.info(f"{Fore.CYAN}Scanning match history for {player_name} (Max pages: {max_pages})...{Style.RESET_ALL}")
-    while current_page <= max_pages:
-        page_url = f"{base_url}?page={current_page}" if current_page > 1 else base_url
-        logging.info(f"{Fore.BLUE}  Processing history page: {current_page}{Style.RESET_ALL}")
-        response = safe_get_request(page_url)
-        if not response: logging.error(f"{Fore.RED}Could not fetch page {current_page}. Stopping pagination.{Style.RESET_ALL}"); break
-        soup = BeautifulSoup(response.text, 'html.parser')
-        container = soup.select_one("div.match-history-list, div.infinite-scroll > div > div")
-        links = container.select("a[href^='/match/']") if container else soup.select(PROFILE_MATCH_LINK_SELECTOR)
-        if not links and current_page > 1: logging.warning(f"{Fore.YELLOW}No more match links found on page {current_page}.{Style.RESET_ALL}"); break
-        new_links_count = 0
-        for a in links:
-            href = a.get('href')
-            if href and href.startswith("/match/") and href.count('/') <= 2:
-                full_url = MATCH_BASE_URL + href
-                if full_url not in all_urls: all_urls.add(full_url); new_links_count += 1
-        if new_links_count == 0 and current_page > 1: logging.info(f"{Fore.YELLOW}No new match links on page {current_page}. Ending pagination.{Style.RESET_ALL}"); break
-        pagination_ul = soup.select_one(PAGINATION_UL_SELECTOR)
-        if not pagination_ul: logging.info(f"{Fore.YELLOW}No pagination block found on page {current_page}. Assuming end of history.{Style.RESET_ALL}"); break
-        next_li = next((li for li in reversed(pagination_ul.select("li.page-item")) if li.select_one("a") and "next" in li.select_one("a").text.lower()), None)
-        if next_li and 'disabled' not in next_li.get('class', []): current_page += 1; time.sleep(REQUEST_DELAY/2)
-        else: logging.info(f"{Fore.YELLOW}'Next' link not available. Pagination finished at page {current_page}.{Style.RESET_ALL}"); break
-    urls = list(all_urls); urls.sort(key=lambda u: int(re.search(r'/(\d+)$',u).group(1)) if re.search(r'/(\d+)$',u) else 0, reverse=True)
-    logging.info(f"{Fore.GREEN}{len(urls)} total unique match links found for {player_name} after scanning history.{Style.RESET_ALL}")
-    return urls[:MAX_MATCHES_PER_PLAYER] if MAX_MATCHES_PER_PLAYER is not None else urls
+# --- MATCH PAGE PARSER BACKENDS ---
+# Each backend turns a match page into the same raw structure:
+#   {'map_name': str|None, 'time_ago': str|None, 'time_iso': (found, str|None),
+#    'tables': None (no stats section) or [{'header': str, 'win': bool, 'rows': [row_fields|None, ...]}]}
+# so everything derived from it (stats, KDA, dates, win flags) is shared and identical across backends.
+def extract_match_page_bs4(page_html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(page_html, 'html.parser')
+    map_el, dt_el, time_tag = soup.select_one(MAP_NAME_SELECTOR), soup.select_one(DATETIME_AGO_SELECTOR), soup.select_one("time[datetime]")
+    page = {'map_name': map_el.text.strip() if map_el else None, 'time_ago': dt_el.text.strip() if dt_el else None,
+            'time_iso': (time_tag is not None, time_tag.get('datetime') if time_tag else None), 'tables': None}
+    stats_section = soup.select_one(MATCH_STATS_SECTION_SELECTOR)
+    if not stats_section: return page
+    page['tables'] = []
+    for table in stats_section.select("div.match-table"):
+        header_el = table.select_one(".match-table__header")
+        page['tables'].append({'header': header_el.get_text() if header_el else "", 'win': 'win' in table.get('class', []),
+                               'rows': [extract_row_fields_bs4(row) for row in table.select(PLAYER_ROW_SELECTOR)]})
+    return page
 
-def analyze_single_match(match_url, tracked_player_id, tracked_player_name):
+def extract_match_page_lxml(page_html):
+    """
+    Single-pass lxml backend: one iterwalk over the tree collects map, time, stats tables and row fields,
+    mirroring the CSS selectors used by the BeautifulSoup backend (first match in document order wins).
+    """
+    from lxml import etree, html as lxml_html
+    page = {'map_name': None, 'time_ago': None, 'time_iso': (False, None), 'tables': None}
+    # Blank, whitespace-only or comment-only bodies: no stats section, as with BeautifulSoup
+    try: root = lxml_html.document_fromstring(page_html.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError: return page
+    time_div_depth, section_el, section_seen = 0, None, False
+    open_tables, open_rows, open_infos = [], [], []
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        tag = el.tag
+        if not isinstance(tag, str): continue
+        if event == "end":
+            if tag == 'div' and 'match-header__time' in (el.get('class') or '').split(): time_div_depth -= 1
+            if el is section_el: section_el = None  # only the first section#match-stats counts
+            for stack in (open_tables, open_rows, open_infos):
+                if stack and stack[-1][0] is el: stack.pop()
+            continue
+        classes = (el.get('class') or '').split()
+        if page['map_name'] is None and ((tag == 'div' and ('match-header__map-name' in classes or 'map-name' in classes)) or (tag == 'span' and 'match-title__map' in classes)):
+            page['map_name'] = el.text_content().strip()
+        if page['time_ago'] is None and ((tag == 'span' and (time_div_depth > 0 or 'timeago' in classes)) or (tag == 'time' and 'timeago' in classes)):
+            page['time_ago'] = el.text_content().strip()
+        if tag == 'div' and 'match-header__time' in classes: time_div_depth += 1
+        if not page['time_iso'][0] and tag == 'time' and el.get('datetime') is not None: page['time_iso'] = (True, el.get('datetime'))
+        if not section_seen and tag == 'section' and el.get('id') == 'match-stats': section_el, section_seen, page['tables'] = el, True, []
+        if section_el is None: continue
+        if tag == 'div' and 'match-table' in classes:
+            table = {'header': None, 'win': 'win' in classes, 'rows': []}
+            page['tables'].append(table); open_tables.append((el, table))
+        if 'match-table__header' in classes:
+            for _, table in open_tables:
+                if table['header'] is None: table['header'] = el.text_content()
+        if open_tables and tag == 'div' and 'row' in classes and 'match-table__row' in classes:
+            row = {'info': None, 'name': None, 'img': None, 'items': []}
+            for _, table in open_tables: table['rows'].append(row)
+            open_rows.append((el, row))
+        if not open_rows: continue
+        if tag == 'div' and 'row__player' in classes:
+            for _, row in open_rows:
+                if row['info'] is None: row['info'] = el
+            open_infos.append((el, None))
+        if open_infos and ((tag == 'a' and 'row__player__name' in classes) or (tag == 'img' and 'row__player__img' in classes)):
+            field, open_info_els = 'name' if tag == 'a' else 'img', [info for info, _ in open_infos]
+            for _, row in open_rows:
+                if row[field] is None and any(row['info'] is info for info in open_info_els): row[field] = el
+        if tag == 'div' and 'row__item' in classes:
+            parent = el.getparent()
+            for row_el, row in open_rows:
+                if parent is row_el: row['items'].append(el.text_content())
+    for table in page['tables'] or []:
+        if table['header'] is None: table['header'] = ""
+        table['rows'] = [(r['name'].text_content(), r['name'].get('href'), r['img'].get('alt', "Unknown"), r['items']) if r['info'] is not None and r['name'] is not None and r['img'] is not None else None for r in table['rows']]
+    return page
+
+MATCH_PARSER_BACKENDS = {'bs4': extract_match_page_bs4, 'lxml': extract_match_page_lxml}
+
+def parse_match_records(match_url, page_html, fetched_at=None, backend=None):
+    """
+    Parses a match page into plain per-player dicts. Returns (player_list, map_name, match_dt),
+    or None when the page has no stats section.
+    """
     match_id = match_url.split("/")[-1]
-    if DB_CFG.get("enable_sqlite") and not DB_CFG.get("force_full_reanalysis") and is_match_in_sqlite(match_id):
-        logging.info(f"{Fore.YELLOW}Match {match_id} already in SQLite. Skipping.{Style.RESET_ALL}"); return [], None, False
-    logging.info(f"{Fore.BLUE}Analyzing from web: {match_url}{Style.RESET_ALL}")
-    response = safe_get_request(match_url)
-    if not response: return [], None, False
-    soup = BeautifulSoup(response.text, 'html.parser')
-    map_name = soup.select_one(MAP_NAME_SELECTOR).text.strip() if soup.select_one(MAP_NAME_SELECTOR) else "Unknown Map"
-    dt_el = soup.select_one(DATETIME_AGO_SELECTOR); match_dt = parse_relative_time(dt_el.text.strip()) if dt_el else None
+    page = MATCH_PARSER_BACKENDS[backend or PARSER_BACKEND](page_html)
+    map_name = page['map_name'] if page['map_name'] is not None else "Unknown Map"
+    match_dt = parse_relative_time(page['time_ago'], fetched_at) if page['time_ago'] is not None else None
     if not match_dt:
-        time_tag = soup.select_one("time[datetime]");
-        if time_tag and time_tag.get('datetime'):
-            try: match_dt = datetime.fromisoformat(time_tag['datetime'].replace('Z','+00:00'))
-            except: logging.debug(f"Could not parse ISO datetime: {time_tag['datetime']}")
-
-    stats_section = soup.select_one(MATCH_STATS_SECTION_SELECTOR)
-    if not stats_section:
-        logging.error(f"{Fore.RED}Could not find stats section in {match_url}.{Style.RESET_ALL}"); return [],None,False
+        _, iso_value = page['time_iso']
+        if iso_value:
+            try: match_dt = datetime.fromisoformat(iso_value.replace('Z','+00:00'))
+            except: log.debug(f"Could not parse ISO datetime: {iso_value}")
+    if page['tables'] is None: return None
 
-    all_tables = stats_section.select("div.match-table")
     players_data_map = defaultdict(dict)
-
-    for table in all_tables:
-        header_text = table.select_one(".match-table__header").get_text().lower() if table.select_one(".match-table__header") else ""
-        is_win_table = 'win' in table.get('class', [])
+    for table in page['tables']:
+        header_text = table['header'].lower()
         table_type = "unknown"
         if "k/d/a" in header_text and "credits" in header_text: table_type = "scoreboard"
         elif "healing" in header_text and "weapon" in header_text: table_type = "performance"
-        for row in table.select(PLAYER_ROW_SELECTOR):
-            player_key, stats = parse_player_stats_from_row(row, table_type)
+        for row_fields in table['rows']:
+            player_key, stats = build_player_stats(row_fields, table_type)
             if player_key and stats:
                 players_data_map[player_key].update(stats)
                 if 'WonMatch' not in players_data_map[player_key]:
-                    players_data_map[player_key]['WonMatch'] = is_win_table
-                    players_data_map[player_key]['TeamIdx'] = 1 if is_win_table else 0
+                    players_data_map[player_key]['WonMatch'] = table['win']
+                    players_data_map[player_key]['TeamIdx'] = 1 if table['win'] else 0
 
     final_player_list = []
-    tracked_player_info = {'team_idx': None, 'won': False}
     for key, data in players_data_map.items():
-        final_data = {
+        final_player_list.append({
             'MatchID': match_id, 'MapName': map_name, 'MatchDateTime': match_dt.isoformat() if match_dt else None,
             'PlayerID': data.get('PlayerID', 'NO_ID'), 'PlayerName': data.get('PlayerName', key),
             'Champion': data.get('Champion', 'Unknown'), 'TeamIdx': data.get('TeamIdx', -1),
@@ -308,51 +1046,438 @@ def analyze_single_match(match_url, tracked_player_id, tracked_player_name):
             'KDA': data.get('KDA', 0.0), 'Credits': data.get('Credits', 0), 'CPM': data.get('CPM', 0),
             'DamageDealt': data.get('DamageDealt', 0), 'DamageTaken': data.get('DamageTaken', 0),
             'Shielding': data.get('Shielding', 0), 'Healing': data.get('Healing', 0)
-        }
-        final_player_list.append(final_data)
+        })
+    return final_player_list, map_name, match_dt
+
+# --- IN-MEMORY RUN STORE ---
+class MatchStatsStore:
+    """
+    Columnar replacement for a list of per-player dicts: numeric stats live in typed arrays and string
+    columns are interned (one int32 code per row plus one copy of each distinct value). to_frame() wraps
+    the arrays without per-row Python objects, so no pd.to_numeric pass or defensive copies are needed.
+    """
+    STRING_COLUMNS = ['MatchID','PlayerName','PlayerID','Champion','MapName','MatchDateTime']
+    INT_COLUMNS = ['TeamIdx','Level','Kills','Deaths','Assists','Credits','CPM','DamageDealt','DamageTaken','Shielding','Healing']
+    COLUMN_ORDER = ['MatchID','PlayerName','PlayerID','Champion','MapName','MatchDateTime','TeamIdx','WonMatch','Level','Kills','Deaths','Assists','KDA','Credits','CPM','DamageDealt','DamageTaken','Shielding','Healing']
+    def __init__(self):
+        self.codes = {c: array('i') for c in self.STRING_COLUMNS}
+        self.lookup = {c: {} for c in self.STRING_COLUMNS}
+        self.ints = {c: array('q') for c in self.INT_COLUMNS}
+        self.won, self.kda = array('b'), array('d')
+    def __len__(self): return len(self.won)
+    def extend(self, rows):
+        for row in rows:
+            for c in self.STRING_COLUMNS:
+                value = row.get(c)
+                # None (e.g. unknown MatchDateTime) is stored as -1, which pandas reads back as NaN
+                self.codes[c].append(-1 if value is None else self.lookup[c].setdefault(value, len(self.lookup[c])))
+            for c in self.INT_COLUMNS: self.ints[c].append(int(row.get(c) or 0))
+            self.won.append(1 if row.get('WonMatch') else 0); self.kda.append(float(row.get('KDA') or 0.0))
+    def to_frame(self):
+        import numpy as np, pandas as pd
+        data = {}
+        for c in self.STRING_COLUMNS:
+            categories = list(self.lookup[c])
+            # Lexically ordered categories keep groupby/mode ordering identical to plain string columns
+            order = sorted(range(len(categories)), key=categories.__getitem__)
+            remap = np.empty(len(categories) + 1, dtype=np.int32); remap[-1] = -1
+            remap[order] = np.arange(len(categories), dtype=np.int32)
+            codes = remap[np.frombuffer(self.codes[c], dtype=np.int32)] if len(self) else np.empty(0, dtype=np.int32)
+            data[c] = pd.Categorical.from_codes(codes, categories=[categories[i] for i in order])
+        for c in self.INT_COLUMNS: data[c] = np.frombuffer(self.ints[c], dtype=np.int64) if len(self) else np.empty(0, dtype=np.int64)
+        data['WonMatch'] = np.frombuffer(self.won, dtype=np.int8).view(np.bool_) if len(self) else np.empty(0, dtype=np.bool_)
+        data['KDA'] = np.frombuffer(self.kda, dtype=np.float64) if len(self) else np.empty(0, dtype=np.float64)
+        return pd.DataFrame({c: data[c] for c in self.COLUMN_ORDER}, copy=False)
+
+# --- PARQUET DATASET EXPORT ---
+# Append-only dataset: <dataset_dir>/TrackedPlayerID=<id>/MatchMonth=<YYYY-MM>/run-<timestamp>-<n>.parquet
+PARQUET_PARTITION_COLUMNS = ['TrackedPlayerID', 'MatchMonth']
+PARQUET_UNDATED_MONTH = "unknown"  # MatchMonth of rows without MatchDateTime; sorts after every "YYYY-MM"
+def _parquet_partitioning():
+    import pyarrow as pa, pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([(c, pa.string()) for c in PARQUET_PARTITION_COLUMNS]), flavor="hive")
+def _parquet_schema():
+    import pyarrow as pa
+    types = {c: pa.string() for c in MatchStatsStore.STRING_COLUMNS}
+    types.update({c: pa.int64() for c in MatchStatsStore.INT_COLUMNS}); types.update({'WonMatch': pa.bool_(), 'KDA': pa.float64()})
+    return pa.schema([(c, types[c]) for c in MatchStatsStore.COLUMN_ORDER] + [(c, pa.string()) for c in PARQUET_PARTITION_COLUMNS])
+def export_run_to_parquet(tracked_player_id, run_stats, dataset_dir=None):
+    """Appends one run's rows for a tracked player as new files in the partitioned Parquet dataset."""
+    try: import pyarrow as pa, pyarrow.dataset as ds
+    except ImportError: log.error(f"{Fore.RED}[PARQUET] 'pyarrow' is not installed (pip install pyarrow). Skipping Parquet export.{Style.RESET_ALL}"); return
+    if not len(run_stats): return
+    df = run_stats.to_frame()
+    df['TrackedPlayerID'] = str(tracked_player_id)
+    df['MatchMonth'] = df['MatchDateTime'].astype(object).str.slice(0, 7).fillna(PARQUET_UNDATED_MONTH)
+    dataset_dir = dataset_dir or PARQUET_CFG.get("dataset_dir", "parquet_dataset")
+    run_tag = f"run-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False).cast(_parquet_schema())
+        ds.write_dataset(table, dataset_dir, format="parquet", partitioning=_parquet_partitioning(), basename_template=run_tag + "-{i}.parquet", existing_data_behavior="overwrite_or_ignore")
+    except (pa.ArrowException, OSError) as e: log.error(f"{Fore.RED}[PARQUET] Could not append to {dataset_dir}: {e}{Style.RESET_ALL}"); return
+    log.info(f"{Fore.GREEN}{table.num_rows} rows appended to Parquet dataset {dataset_dir}.{Style.RESET_ALL}")
+def read_parquet_dataset(dataset_dir=None, columns=None, players=None, start_month=None, end_month=None, filter=None):
+    """
+    Loads rows from the Parquet dataset as a DataFrame. `columns` is pushed down as a projection;
+    `players` (tracked player IDs) and the inclusive "YYYY-MM" month range prune partitions before any
+    file is opened; `filter` is an optional extra pyarrow.dataset expression (e.g. ds.field('Kills') > 20).
+    Rows without a match date are never inside a month range, so they are only returned when no month is given.
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(dataset_dir or PARQUET_CFG.get("dataset_dir", "parquet_dataset"), format="parquet", partitioning=_parquet_partitioning())
+    expr = filter
+    for cond in ((ds.field('TrackedPlayerID').isin([str(p) for p in players]) if players else None),
+                 (ds.field('MatchMonth') != PARQUET_UNDATED_MONTH if start_month or end_month else None),
+                 (ds.field('MatchMonth') >= start_month if start_month else None), (ds.field('MatchMonth') <= end_month if end_month else None)):
+        if cond is not None: expr = cond if expr is None else expr & cond
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+# --- CORE SCRAPING AND ANALYSIS FUNCTIONS ---
+def download_match_links_for_player(player_name, player_id):
+    """
+    Returns (match_urls, scan_complete). scan_complete is False when a history page could not be fetched:
+    the pages after it were never seen, so the caller must not record a watermark for this scan.
+    """
+    from bs4 import BeautifulSoup
+    base_url = PROFILE_URL_TEMPLATE.format(id=player_id, name=player_name.lower().replace(" ", "%20"))
+    all_urls = set()
+    current_page, max_pages = 1, MAX_PAGES_TO_SCAN_HISTORY if MAX_PAGES_TO_SCAN_HISTORY is not None else 50
+    # Incremental mode: once the player has a watermark, a page made only of known matches ends the scan.
+    watermark = get_player_watermark(player_id) if INCREMENTAL_HISTORY_SCAN and not DB_CFG.get("force_full_reanalysis") else None
+    scan_mode = f"incremental, newest known match {watermark}" if watermark else "full"
+    # Frontier mode: an interrupted scan resumes at its last finished page (read again in case new matches shifted the pages)
+    resume, scan_complete = get_frontier_scan(player_id) if FRONTIER_ENABLED else None, True
+    if resume and not resume[1] and resume[0] > 1: current_page = resume[0] - 1; scan_mode += f", resuming at page {current_page}"
+    # A finished frontier scan queued the whole history already: like a watermark, it allows the incremental stop
+    # (at a page whose matches are all stored or queued), even if the run was interrupted before any match was stored
+    queued_history = bool(resume and resume[1]) and INCREMENTAL_HISTORY_SCAN and not DB_CFG.get("force_full_reanalysis")
+    if queued_history and not watermark: scan_mode = "incremental, history already queued in the crawl frontier"
+    log.info(f"{Fore.CYAN}Scanning match history for {player_name} (Max pages: {max_pages}, {scan_mode})...{Style.RESET_ALL}")
+    while current_page <= max_pages:
+        page_url = f"{base_url}?page={current_page}" if current_page > 1 else base_url
+        log.info(f"{Fore.BLUE}  Processing history page: {current_page}{Style.RESET_ALL}")
+        page_html, _ = fetch_page_html(page_url, "history")
+        if page_html is None: log.error(f"{Fore.RED}Could not fetch page {current_page}. Stopping pagination.{Style.RESET_ALL}"); scan_complete = False; break
+        METRICS.inc("history_pages")
+        with METRICS.timer("history_parse"):
+            soup = BeautifulSoup(page_html, 'html.parser')
+            container = soup.select_one("div.match-history-list, div.infinite-scroll > div > div")
+            links = container.select("a[href^='/match/']") if container else soup.select(PROFILE_MATCH_LINK_SELECTOR)
+        if not links and current_page > 1: log.warning(f"{Fore.YELLOW}No more match links found on page {current_page}.{Style.RESET_ALL}"); break
+        new_links_count, page_match_ids = 0, []
+        for a in links:
+            href = a.get('href')
+            if href and href.startswith("/match/") and href.count('/') <= 2:
+                full_url = MATCH_BASE_URL + href; page_match_ids.append(href.split("/")[-1])
+                if full_url not in all_urls: all_urls.add(full_url); new_links_count += 1
+        known = set()
+        if FRONTIER_ENABLED:
+            stored = matches_in_sqlite(page_match_ids); known = stored | (frontier_members(player_id, page_match_ids) if queued_history else set())
+            force = DB_CFG.get("force_full_reanalysis")  # stored matches are queued (again) so they are analyzed anew
+            frontier_add(player_id, [m for m in dict.fromkeys(page_match_ids) if force or m not in stored], reset=force); set_frontier_scan(player_id, current_page + 1, False)
+        if new_links_count == 0 and current_page > 1: log.info(f"{Fore.YELLOW}No new match links on page {current_page}. Ending pagination.{Style.RESET_ALL}"); break
+        if (watermark or queued_history) and page_match_ids and len(known or matches_in_sqlite(page_match_ids)) == len(set(page_match_ids)):
+            log.info(f"{Fore.YELLOW}Every match on page {current_page} is already in SQLite or the crawl frontier. Incremental scan stops here.{Style.RESET_ALL}"); break
+        pagination_ul = soup.select_one(PAGINATION_UL_SELECTOR)
+        if not pagination_ul: log.info(f"{Fore.YELLOW}No pagination block found on page {current_page}. Assuming end of history.{Style.RESET_ALL}"); break
+        next_li = next((li for li in reversed(pagination_ul.select("li.page-item")) if li.select_one("a") and "next" in li.select_one("a").text.lower()), None)
+        if next_li and 'disabled' not in next_li.get('class', []): current_page += 1; METRICS.sleep("pacing_sleep", 0 if ADAPTIVE_RATE else REQUEST_DELAY/2)
+        else: log.info(f"{Fore.YELLOW}'Next' link not available. Pagination finished at page {current_page}.{Style.RESET_ALL}"); break
+    if FRONTIER_ENABLED: set_frontier_scan(player_id, 1 if scan_complete else current_page, scan_complete)
+    urls = list(all_urls); urls.sort(key=lambda u: int(re.search(r'/(\d+)$',u).group(1)) if re.search(r'/(\d+)$',u) else 0, reverse=True)
+    log.info(f"{Fore.GREEN}{len(urls)} total unique match links found for {player_name} after scanning history.{Style.RESET_ALL}")
+    return (urls[:MAX_MATCHES_PER_PLAYER] if MAX_MATCHES_PER_PLAYER is not None else urls), scan_complete
+
+def is_match_already_processed(match_id, known_match_ids=None):
+    if not DB_CFG.get("enable_sqlite") or DB_CFG.get("force_full_reanalysis"): return False
+    if match_id in PENDING_MATCH_IDS or (is_match_in_sqlite(match_id) if known_match_ids is None else match_id in known_match_ids):
+        METRICS.inc("matches_skipped")
+        log.info(f"{Fore.YELLOW}Match {match_id} already in SQLite. Skipping.{Style.RESET_ALL}"); return True
+    return False
+
+def fetch_match_page(match_url):
+    log.info(f"{Fore.BLUE}Analyzing from web: {match_url}{Style.RESET_ALL}")
+    return fetch_page_html(match_url, "match")
+
+def analyze_single_match(match_url, tracked_player_id, tracked_player_name, known_match_ids=None):
+    if is_match_already_processed(match_url.split("/")[-1], known_match_ids): return [], None, False
+    page_html, fetched_at = fetch_match_page(match_url)
+    if page_html is None: METRICS.inc("matches_failed"); return [], None, False
+    return analyze_match_html(match_url, page_html, tracked_player_id, tracked_player_name, fetched_at)
+
+def analyze_match_html(match_url, page_html, tracked_player_id, tracked_player_name, fetched_at=None):
+    with METRICS.timer("match_parse"): parsed = parse_match_records(match_url, page_html, fetched_at)
+    return record_parsed_match(match_url, parsed, tracked_player_id, tracked_player_name)
+
+def timed_parse_match_records(match_url, page_html, fetched_at=None, backend=None):
+    """parse_match_records plus its duration, for parse workers whose own METRICS never reach the parent process."""
+    start = time.perf_counter()
+    return parse_match_records(match_url, page_html, fetched_at, backend), time.perf_counter() - start
+
+def record_parsed_match(match_url, parsed, tracked_player_id, tracked_player_name):
+    """Persists the output of parse_match_records and locates the tracked player in it."""
+    match_id = match_url.split("/")[-1]
+    if parsed is None:
+        METRICS.inc("matches_failed")
+        log.error(f"{Fore.RED}Could not find stats section in {match_url}.{Style.RESET_ALL}"); return [],None,False
+    METRICS.inc("matches_parsed")
+    final_player_list, map_name, match_dt = parsed
+
+    team_idx, won = find_tracked_player(final_player_list, tracked_player_id, tracked_player_name) if tracked_player_id is not None else (None, False)
+    if team_idx is None and tracked_player_id is not None:
+        log.warning(f"{Fore.YELLOW}Tracked player '{tracked_player_name}' (ID: {tracked_player_id}) not found in match data for {match_url}{Style.RESET_ALL}")
+
+    if final_player_list: save_match_data_to_sqlite(match_id, map_name, match_dt, final_player_list)
+    return final_player_list, team_idx, won
+
+def find_tracked_player(match_data, tracked_player_id, tracked_player_name):
+    """Returns (team_idx, won) of the tracked player in a parsed match, or (None, False) if absent."""
+    tracked_player_info = {'team_idx': None, 'won': False}
+    for final_data in match_data:
         if final_data['PlayerID'] == tracked_player_id or final_data['PlayerName'].lower() == tracked_player_name.lower():
             tracked_player_info['team_idx'] = final_data['TeamIdx']
             tracked_player_info['won'] = final_data['WonMatch']
+    return tracked_player_info['team_idx'], tracked_player_info['won']
 
-    if tracked_player_info['team_idx'] is None:
-        logging.warning(f"{Fore.YELLOW}Tracked player '{tracked_player_name}' (ID: {tracked_player_id}) not found in match data for {match_url}{Style.RESET_ALL}")
+def iter_match_results(match_urls, tracked_player_id, tracked_player_name):
+    """
+    Yields (url, match_data, team_idx, won_match) for every URL, always in the order of match_urls.
+    With concurrent_requests > 1 the downloads run in a thread pool (paced by the shared RATE_LIMITER),
+    while parsing, SQLite writes and bookkeeping stay on the calling thread so results match the serial path.
+    """
+    total = len(match_urls)
+    if PIPELINE_ENABLED: yield from iter_match_results_pipelined(match_urls, tracked_player_id, tracked_player_name); return
+    known_match_ids = matches_in_sqlite([url.split("/")[-1] for url in match_urls])
+    if CONCURRENT_REQUESTS <= 1:
+        for i, url in enumerate(match_urls):
+            log.info(f"{Fore.WHITE}--- Match {i+1}/{total} for {tracked_player_name} ({url.split('/')[-1]}) ---{Style.RESET_ALL}")
+            match_data, team_idx, won_match = analyze_single_match(url, tracked_player_id, tracked_player_name, known_match_ids)
+            yield url, match_data, team_idx, won_match
+            if not ADAPTIVE_RATE: METRICS.sleep("pacing_sleep", 0.1 if not match_data and team_idx is None else REQUEST_DELAY)
+        return
 
-    if final_player_list: save_match_data_to_sqlite(match_id, map_name, match_dt, final_player_list)
-    return final_player_list, tracked_player_info['team_idx'], tracked_player_info['won']
+    log.info(f"{Fore.CYAN}Fetching {total} matches with {CONCURRENT_REQUESTS} concurrent requests (limit: {MAX_REQUESTS_PER_SEC or 'none'} req/s per host).{Style.RESET_ALL}")
+    pool, window, pending_urls = ThreadPoolExecutor(max_workers=CONCURRENT_REQUESTS), deque(), iter(enumerate(match_urls))
+    fetch = profiled(fetch_match_page)
+    def fill_window():
+        # Bounded look-ahead: never more than 2x workers pages downloaded but not yet consumed.
+        while len(window) < CONCURRENT_REQUESTS * 2:
+            i, url = next(pending_urls, (None, None))
+            if url is None: return
+            skip = is_match_already_processed(url.split("/")[-1], known_match_ids)
+            window.append((i, url, None if skip else pool.submit(fetch, url)))
+    try:
+        fill_window()
+        while window:
+            i, url, future = window.popleft()
+            log.info(f"{Fore.WHITE}--- Match {i+1}/{total} for {tracked_player_name} ({url.split('/')[-1]}) ---{Style.RESET_ALL}")
+            page_html, fetched_at = future.result() if future else (None, None)
+            if page_html is None:
+                if future: METRICS.inc("matches_failed")
+                yield url, [], None, False
+            else: yield (url,) + tuple(analyze_match_html(url, page_html, tracked_player_id, tracked_player_name, fetched_at))
+            fill_window()
+    finally:
+        for _, _, future in window:
+            if future: future.cancel()
+        pool.shutdown(wait=True)
+
+def iter_match_results_pipelined(match_urls, tracked_player_id, tracked_player_name):
+    """
+    Staged variant of iter_match_results: fetch threads -> bounded queue -> ProcessPoolExecutor parsing
+    -> this (single) writer thread, which persists to SQLite and yields results in match_urls order.
+    A window semaphore caps how many matches may be between "queued for fetch" and "yielded", so
+    memory stays flat however long the history is; full queues block the upstream stage (back-pressure).
+    """
+    total = len(match_urls)
+    known_match_ids = matches_in_sqlite([url.split("/")[-1] for url in match_urls])
+    skipped = {i for i, url in enumerate(match_urls) if is_match_already_processed(url.split("/")[-1], known_match_ids)}
+    to_fetch = [(i, url) for i, url in enumerate(match_urls) if i not in skipped]
+    log.info(f"{Fore.CYAN}Pipeline: {len(to_fetch)} matches to fetch ({PIPELINE_FETCH_WORKERS} fetch workers, {PIPELINE_PARSE_WORKERS} parse processes, queues {PIPELINE_FETCH_QUEUE}/{PIPELINE_PARSE_QUEUE}).{Style.RESET_ALL}")
+    url_q, html_q, result_q = queue.Queue(maxsize=PIPELINE_FETCH_QUEUE), queue.Queue(maxsize=PIPELINE_PARSE_QUEUE), queue.Queue()
+    window, parse_slots, stop = threading.Semaphore(PIPELINE_FETCH_QUEUE + PIPELINE_PARSE_QUEUE), threading.Semaphore(PIPELINE_PARSE_WORKERS * 2), threading.Event()
+    failed, in_flight = threading.Event(), set()  # in_flight: indices submitted to the process pool whose result is not queued yet
+
+    def put(q, item):
+        while not stop.is_set():
+            try: q.put(item, timeout=0.2); return True
+            except queue.Full: continue
+        return False
+    def acquire(sem):
+        while not stop.is_set():
+            if sem.acquire(timeout=0.2): return True
+        return False
+    def feeder():
+        for item in to_fetch:
+            if not acquire(window) or not put(url_q, item): return
+        for _ in range(PIPELINE_FETCH_WORKERS): put(url_q, None)
+    def fetch_worker():
+        while not stop.is_set():
+            try: item = url_q.get(timeout=0.2)
+            except queue.Empty: continue
+            if item is None: put(html_q, None); return
+            i, url = item
+            try: page_html, fetched_at = fetch_match_page(url)
+            except Exception as e: log.error(f"{Fore.RED}Fetch worker failed on {url}: {e}{Style.RESET_ALL}"); page_html, fetched_at = None, None
+            put(html_q, (i, url, page_html, fetched_at))
+    def parse_dispatcher(proc_pool):
+        finished_fetchers = 0
+        while not stop.is_set() and finished_fetchers < PIPELINE_FETCH_WORKERS:
+            try: item = html_q.get(timeout=0.2)
+            except queue.Empty: continue
+            if item is None: finished_fetchers += 1; continue
+            i, url, page_html, fetched_at = item
+            if page_html is None: result_q.put((i, url, None)); continue
+            if not acquire(parse_slots): return
+            in_flight.add(i)
+            try: future = proc_pool.submit(timed_parse_match_records, url, page_html, fetched_at, PARSER_BACKEND)
+            except Exception:  # BrokenProcessPool once a parse process died (OOM kill, segfault)
+                in_flight.discard(i); parse_slots.release(); result_q.put((i, url, None)); raise
+            future.add_done_callback(lambda f, i=i, url=url: (result_q.put((i, url, f)), in_flight.discard(i), parse_slots.release()))
+    def stage(target, *args):
+        """Pipeline thread whose unexpected failure stops the pipeline (the writer then fails what cannot arrive) instead of stalling it."""
+        def run():
+            try: target(*args)
+            except Exception as e:
+                log.error(f"{Fore.RED}Pipeline stage {target.__name__} failed: {e!r}. Matches not parsed yet are counted as failed.{Style.RESET_ALL}")
+                failed.set(); stop.set()
+        return threading.Thread(target=profiled(run), daemon=True)
+
+    proc_pool = ProcessPoolExecutor(max_workers=PIPELINE_PARSE_WORKERS)
+    dispatcher = stage(parse_dispatcher, proc_pool)
+    threads = [stage(feeder), dispatcher] + [stage(fetch_worker) for _ in range(PIPELINE_FETCH_WORKERS)]
+    for t in threads: t.start()
+    ready, next_idx = {}, 0
+    try:
+        while next_idx < total:
+            if next_idx in skipped:
+                log.info(f"{Fore.WHITE}--- Match {next_idx+1}/{total} for {tracked_player_name} ({match_urls[next_idx].split('/')[-1]}) ---{Style.RESET_ALL}")
+                yield match_urls[next_idx], [], None, False; next_idx += 1; continue
+            if next_idx not in ready:
+                # Once the dispatcher is gone (finished or failed), every result still to come is queued or in flight
+                waiting = next_idx in in_flight or (dispatcher.is_alive() and not failed.is_set())
+                try: i, url, future = result_q.get(timeout=0.5 if waiting else 0); ready[i] = (url, future); continue
+                except queue.Empty:
+                    if not waiting: ready[next_idx] = (match_urls[next_idx], None)  # never coming back: counted as failed
+                    continue
+            url, future = ready.pop(next_idx); window.release()
+            log.info(f"{Fore.WHITE}--- Match {next_idx+1}/{total} for {tracked_player_name} ({url.split('/')[-1]}) ---{Style.RESET_ALL}")
+            next_idx += 1
+            if future is None: METRICS.inc("matches_failed"); yield url, [], None, False; continue
+            try: parsed, parse_time = future.result(); METRICS.observe("match_parse", parse_time)
+            except Exception as e: METRICS.inc("matches_failed"); log.error(f"{Fore.RED}Parse worker failed on {url}: {e}{Style.RESET_ALL}"); yield url, [], None, False; continue
+            yield (url,) + tuple(record_parsed_match(url, parsed, tracked_player_id, tracked_player_name))
+    finally:
+        stop.set()
+        for t in threads: t.join(timeout=5)
+        proc_pool.shutdown(wait=True)
+
+def iter_frontier_results(player_ids, tracked_player_id, tracked_player_name, limit=None):
+    """
+    Frontier-backed source of iter_match_results tuples: claims leased batches of pending matches from the
+    histories of player_ids (any player's when None), runs each batch through iter_match_results and then
+    marks its matches done/failed. Other processes claiming from the same database get disjoint batches.
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        batch = claim_frontier_batch(player_ids, FRONTIER_BATCH if limit is None else min(FRONTIER_BATCH, limit - processed))
+        if not batch: break
+        log.info(f"{Fore.CYAN}Claimed {len(batch)} matches from the crawl frontier (worker {WORKER_ID}).{Style.RESET_ALL}")
+        try: yield from iter_match_results([f"{MATCH_BASE_URL}/match/{m}" for m in batch], tracked_player_id, tracked_player_name)
+        except BaseException: flush_sqlite_writes(); finish_frontier_batch(batch, interrupted=True); raise
+        flush_sqlite_writes(); finish_frontier_batch(batch); processed += len(batch)
+    counts = frontier_counts(player_ids)
+    log.info(f"{Fore.CYAN}Crawl frontier: {', '.join(f'{counts.get(state, 0)} {state}' for state in ('pending', 'claimed', 'done', 'failed'))}.{Style.RESET_ALL}")
 
 def process_player_analysis(main_player_name, main_player_id):
-    logging.info(f"{Fore.MAGENTA}=== Starting analysis for: {main_player_name} (ID: {main_player_id}) ==={Style.RESET_ALL}")
-    match_urls = download_match_links_for_player(main_player_name, main_player_id)
-    if not match_urls: logging.error(f"{Fore.RED}No match URLs found for {main_player_name}.{Style.RESET_ALL}"); return
-
-    all_stats_list, relationships = [], defaultdict(lambda: {'name':'Unknown','with_games':0,'with_wins':0,'vs_games':0,'vs_wins':0,'vs_losses':0})
-    wins, matches_found = 0, 0
-
-    for i,url in enumerate(match_urls):
-        logging.info(f"{Fore.WHITE}--- Match {i+1}/{len(match_urls)} for {main_player_name} ({url.split('/')[-1]}) ---{Style.RESET_ALL}")
-        match_data, team_idx, won_match = analyze_single_match(url, main_player_id, main_player_name)
-        if not match_data and team_idx is None: logging.info(f"{Fore.YELLOW}Match skipped (already processed).{Style.RESET_ALL}"); time.sleep(0.1); continue
-        if not match_data: logging.warning(f"{Fore.YELLOW}No player data returned for {url}.{Style.RESET_ALL}"); time.sleep(REQUEST_DELAY); continue
-
-        all_stats_list.extend(match_data)
-        if team_idx is not None:
-            matches_found+=1; wins+=1 if won_match else 0
-            for p in match_data:
-                other_pid = p.get('PlayerID',"NO_ID")
-                if not other_pid or other_pid==main_player_id or other_pid in ["NO_ID","ERROR"]: continue
-                if relationships[other_pid]['name']=='Unknown': relationships[other_pid]['name']=p.get('PlayerName','Unknown')
-                if p.get('TeamIdx')==team_idx: relationships[other_pid]['with_games']+=1; relationships[other_pid]['with_wins']+=1 if won_match else 0
-                else: relationships[other_pid]['vs_games']+=1; relationships[other_pid]['vs_wins']+=1 if won_match else 0; relationships[other_pid]['vs_losses']+=0 if won_match else 1
-        time.sleep(REQUEST_DELAY)
-
-    if not all_stats_list: logging.warning(f"{Fore.YELLOW}No new matches were analyzed. CSV/console reports will be empty for this run.{Style.RESET_ALL}"); return
-
-    df_run_stats = pd.DataFrame(all_stats_list)
+    log.info(f"{Fore.MAGENTA}=== Starting analysis for: {main_player_name} (ID: {main_player_id}) ==={Style.RESET_ALL}")
+    match_urls, scan_complete = download_match_links_for_player(main_player_name, main_player_id)
+    if not match_urls and not FRONTIER_ENABLED: log.error(f"{Fore.RED}No match URLs found for {main_player_name}.{Style.RESET_ALL}"); return
+
+    run_state = new_player_run_state()
+    results = iter_frontier_results([main_player_id], main_player_id, main_player_name, MAX_MATCHES_PER_PLAYER) if FRONTIER_ENABLED else iter_match_results(match_urls, main_player_id, main_player_name)
+    for url, match_data, team_idx, won_match in results:
+        if not match_data and team_idx is None: log.info(f"{Fore.YELLOW}Match skipped (already processed).{Style.RESET_ALL}"); continue
+        if not match_data: log.warning(f"{Fore.YELLOW}No player data returned for {url}.{Style.RESET_ALL}"); continue
+        accumulate_player_match(run_state, main_player_id, match_data, team_idx, won_match)
+
+    flush_sqlite_writes()
+    update_player_watermark_from_urls(main_player_id, match_urls, scan_complete)
+    with METRICS.timer("report"): report_player_analysis(main_player_name, main_player_id, run_state)
+    return run_state
+
+def new_player_run_state():
+    return {'stats': MatchStatsStore(), 'relationships': defaultdict(lambda: {'name':'Unknown','with_games':0,'with_wins':0,'vs_games':0,'vs_wins':0,'vs_losses':0}), 'wins': 0, 'matches_found': 0}
+
+def accumulate_player_match(run_state, main_player_id, match_data, team_idx, won_match):
+    """Adds one parsed match to a player's per-run rows, win counter and relationship counters."""
+    relationships = run_state['relationships']
+    run_state['stats'].extend(match_data)
+    if team_idx is not None:
+        run_state['matches_found']+=1; run_state['wins']+=1 if won_match else 0
+        for p in match_data:
+            other_pid = p.get('PlayerID',"NO_ID")
+            if not other_pid or other_pid==main_player_id or other_pid in ["NO_ID","ERROR"]: continue
+            if relationships[other_pid]['name']=='Unknown': relationships[other_pid]['name']=p.get('PlayerName','Unknown')
+            if p.get('TeamIdx')==team_idx: relationships[other_pid]['with_games']+=1; relationships[other_pid]['with_wins']+=1 if won_match else 0
+            else: relationships[other_pid]['vs_games']+=1; relationships[other_pid]['vs_wins']+=1 if won_match else 0; relationships[other_pid]['vs_losses']+=0 if won_match else 1
+
+def update_player_watermark_from_urls(player_id, match_urls, scan_complete=True):
+    """Advances the watermark to the newest stored match, but only after a scan that reached its end or its incremental stop."""
+    if not scan_complete: log.warning(f"{Fore.YELLOW}History scan for player {player_id} was incomplete; watermark not updated (next run scans in full again).{Style.RESET_ALL}"); return
+    stored_ids = [m for m in matches_in_sqlite([url.split("/")[-1] for url in match_urls], include_queued=False) if m.isdigit()]
+    if stored_ids: set_player_watermark(player_id, max(stored_ids, key=int))
+
+def process_group_analysis(targets):
+    """
+    Deduplicated crawl for several tracked players (e.g. a premade): the union of their match URLs is
+    fetched and parsed once, and each match feeds the run state of every tracked player that appears in it.
+    """
+    log.info(f"{Fore.MAGENTA}=== Starting group analysis for: {', '.join(targets)} ==={Style.RESET_ALL}")
+    urls_by_player, scan_complete, all_urls = {}, {}, {}
+    for name, pid in targets.items():
+        urls_by_player[name], scan_complete[name] = download_match_links_for_player(name, pid)
+        for url in urls_by_player[name]: all_urls.setdefault(url, set()).add(name)
+    if not all_urls and not FRONTIER_ENABLED: log.error(f"{Fore.RED}No match URLs found for any tracked player.{Style.RESET_ALL}"); return
+    match_urls = sorted(all_urls, key=lambda u: int(re.search(r'/(\d+)$',u).group(1)) if re.search(r'/(\d+)$',u) else 0, reverse=True)
+    per_player_total = sum(len(urls) for urls in urls_by_player.values())
+    log.info(f"{Fore.CYAN}{len(match_urls)} unique matches across {len(targets)} players ({per_player_total - len(match_urls)} duplicate fetches avoided).{Style.RESET_ALL}")
+
+    run_states = {name: new_player_run_state() for name in targets}
+    group_label = f"group ({len(targets)} players)"
+    results = iter_frontier_results(list(targets.values()), None, group_label) if FRONTIER_ENABLED else iter_match_results(match_urls, None, group_label)
+    for url, match_data, _, _ in results:
+        if not match_data: log.info(f"{Fore.YELLOW}Match skipped (already processed or no data).{Style.RESET_ALL}"); continue
+        for name, pid in targets.items():
+            team_idx, won_match = find_tracked_player(match_data, pid, name)
+            if team_idx is None and name not in all_urls.get(url, ()): continue
+            accumulate_player_match(run_states[name], pid, match_data, team_idx, won_match)
+
+    flush_sqlite_writes()
+    for name, pid in targets.items():
+        update_player_watermark_from_urls(pid, urls_by_player[name], scan_complete[name])
+        log.info(f"{Fore.MAGENTA}=== Report for: {name} (ID: {pid}) ==={Style.RESET_ALL}")
+        with METRICS.timer("report"): report_player_analysis(name, pid, run_states[name])
+    return run_states
+
+def process_frontier_worker():
+    """--worker: drains every player's pending matches from the shared crawl frontier into SQLite, without reports."""
+    if not FRONTIER_ENABLED or not DB_CONN: log.critical(f"{Fore.RED}--worker needs SQLite and 'enable_frontier' in frontier_options ({CONFIG_FILE}).{Style.RESET_ALL}"); return
+    log.info(f"{Fore.MAGENTA}=== Frontier worker {WORKER_ID} started ==={Style.RESET_ALL}")
+    stored = sum(1 for _, match_data, _, _ in iter_frontier_results(None, None, f"worker {WORKER_ID}") if match_data)
+    log.info(f"{Fore.GREEN}Frontier worker finished: {stored} matches stored, nothing left to claim.{Style.RESET_ALL}")
+
+def report_player_analysis(main_player_name, main_player_id, run_state):
+    """CSV exports and console summaries for one player's run."""
+    run_stats, relationships, wins, matches_found = run_state['stats'], run_state['relationships'], run_state['wins'], run_state['matches_found']
+    if not len(run_stats): log.warning(f"{Fore.YELLOW}No new matches were analyzed. CSV/console reports will be empty for this run.{Style.RESET_ALL}"); return
+
+    import pandas as pd
+    # Typed, already in export column order: no per-column coercion needed below
+    df_run_stats = run_stats.to_frame()
 
     if CSV_CFG.get("generate_detailed_stats_csv") and not df_run_stats.empty:
-        cols_order=['MatchID','PlayerName','PlayerID','Champion','MapName','MatchDateTime','TeamIdx','WonMatch','Level','Kills','Deaths','Assists','KDA','Credits','CPM','DamageDealt','DamageTaken','Shielding','Healing']
-        cols_use=[c for c in cols_order if c in df_run_stats.columns]; df_out=df_run_stats[cols_use] if cols_use and not df_run_stats.empty else df_run_stats
-        df_out.to_csv(f"stats_{main_player_name.replace(' ', '_')}.csv",index=False,encoding='utf-8-sig'); logging.info(f"{Fore.GREEN}Detailed stats for this run saved.{Style.RESET_ALL}")
+        df_run_stats.to_csv(f"stats_{main_player_name.replace(' ', '_')}.csv",index=False,encoding='utf-8-sig'); log.info(f"{Fore.GREEN}Detailed stats for this run saved.{Style.RESET_ALL}")
 
     df_rels = pd.DataFrame()
     if relationships:
@@ -360,75 +1485,297 @@ def process_player_analysis(main_player_name, main_player_id):
         for pid, d in relationships.items():
             rel_list.append({'OtherPlayerID':pid, 'OtherPlayerName':d['name'],'PlayedWith_Games':d['with_games'], 'With_Wins':d['with_wins'], 'With_Losses':d['with_games'] - d['with_wins'],'PlayedWith_WinRate (%)':(d['with_wins']/d['with_games']*100) if d['with_games']>0 else 0,'PlayedVs_Games':d['vs_games'], 'MainPlayer_Wins_Vs':d['vs_wins'], 'MainPlayer_Losses_Vs':d['vs_losses'],'WinRateVs_ForMainPlayer (%)':(d['vs_wins']/d['vs_games']*100) if d['vs_games']>0 else 0,'TotalInteractions':d['with_games']+d['vs_games']})
         if rel_list: df_rels=pd.DataFrame(rel_list).sort_values(by=['TotalInteractions','PlayedWith_Games'],ascending=[False,False])
+    if PARQUET_CFG.get("enable_parquet_export"): export_run_to_parquet(main_player_id, run_stats)
+
     if CSV_CFG.get("generate_relations_csv"):
         df_rels.to_csv(f"relations_{main_player_name.replace(' ', '_')}.csv",index=False,encoding='utf-8-sig')
-        logging.info(f"{Fore.GREEN}Relationship stats for this run saved.{Style.RESET_ALL}" if not df_rels.empty else f"{Fore.YELLOW}Relationship stats file (empty) saved.{Style.RESET_ALL}")
+        log.info(f"{Fore.GREEN}Relationship stats for this run saved.{Style.RESET_ALL}" if not df_rels.empty else f"{Fore.YELLOW}Relationship stats file (empty) saved.{Style.RESET_ALL}")
 
     # --- Console Summaries and Additional CSVs ---
     if not df_run_stats.empty:
-        df_player = df_run_stats[df_run_stats['PlayerID']==str(main_player_id)].copy()
+        df_player = df_run_stats[df_run_stats['PlayerID']==str(main_player_id)]
         if not df_player.empty:
             # Stats per Champion
             if GENERAL_CFG.get("analyze_champion_stats"):
-                logging.info(f"{Fore.CYAN}--- CHAMPION STATS FOR {main_player_name.upper()} (this run) ---{Style.RESET_ALL}")
-                num_cols=['Level','Kills','Deaths','Assists','KDA','Credits','CPM','DamageDealt','DamageTaken','Shielding','Healing','WonMatch']
-                for c in num_cols:
-                    if c in df_player.columns:df_player.loc[:,c]=pd.to_numeric(df_player[c],errors='coerce')
-                if 'WonMatch' in df_player.columns:df_player.loc[:,'Wins']=df_player['WonMatch'].astype(int)
-                stats_ch=df_player.groupby('Champion').agg(P=('MatchID','nunique'),V=('Wins','sum'),K=('Kills','mean'),D=('Deaths','mean'),A=('Assists','mean'),KDA_avg=('KDA','mean'),Dmg=('DamageDealt','mean'),H=('Healing','mean'),S=('Shielding','mean'),L=('Level','mean')).sort_values(by='P',ascending=False)
+                log.info(f"{Fore.CYAN}--- CHAMPION STATS FOR {main_player_name.upper()} (this run) ---{Style.RESET_ALL}")
+                stats_ch=df_player.groupby('Champion', observed=True).agg(P=('MatchID','nunique'),V=('WonMatch','sum'),K=('Kills','mean'),D=('Deaths','mean'),A=('Assists','mean'),KDA_avg=('KDA','mean'),Dmg=('DamageDealt','mean'),H=('Healing','mean'),S=('Shielding','mean'),L=('Level','mean')).sort_values(by='P',ascending=False)
                 if not stats_ch.empty:
                     stats_ch.loc[:,'WR (%)']=(stats_ch['V']/stats_ch['P']*100)
                     cols_d_ch = {'P':None,'V':None,'WR (%)':lambda x:f"{x:.1f}%",'KDA_avg':lambda x:f"{x:.2f}",'K':lambda x:f"{x:.1f}",'D':lambda x:f"{x:.1f}",'A':lambda x:f"{x:.1f}",'Dmg':lambda x:f"{x:,.0f}",'H':lambda x:f"{x:,.0f}",'S':lambda x:f"{x:,.0f}",'L':lambda x:f"{x:.0f}"}
                     f_cols_ch=[c for c in cols_d_ch if c in stats_ch.columns]; f_fmt_ch={k:v for k,v in cols_d_ch.items() if k in f_cols_ch and v is not None}
                     print(stats_ch[f_cols_ch].head(TOP_N_RELATIONS).to_string(formatters=f_fmt_ch if f_fmt_ch else None))
-                    if CSV_CFG.get("generate_champ_stats_csv"): stats_ch[f_cols_ch].to_csv(f"champ_stats_{main_player_name.replace(' ','_')}.csv",encoding='utf-8-sig'); logging.info(f"{Fore.GREEN}Champion stats for this run saved.{Style.RESET_ALL}")
+                    if CSV_CFG.get("generate_champ_stats_csv"): stats_ch[f_cols_ch].to_csv(f"champ_stats_{main_player_name.replace(' ','_')}.csv",encoding='utf-8-sig'); log.info(f"{Fore.GREEN}Champion stats for this run saved.{Style.RESET_ALL}")
 
             # Stats per Map
             if GENERAL_CFG.get("analyze_map_stats") and 'MapName' in df_player.columns and df_player['MapName'].nunique()>1 and df_player['MapName'].mode().iloc[0]!="Unknown Map":
-                logging.info(f"{Fore.CYAN}--- MAP STATS FOR {main_player_name.upper()} (this run) ---{Style.RESET_ALL}")
-                if 'WonMatch' in df_player.columns:df_player.loc[:,'WinsMap']=df_player['WonMatch'].astype(int)
-                stats_map=df_player.groupby('MapName').agg(P=('MatchID','nunique'),V=('WinsMap','sum'),KDA_avg=('KDA','mean'),Dmg=('DamageDealt','mean'),H=('Healing','mean')).sort_values(by='P',ascending=False)
+                log.info(f"{Fore.CYAN}--- MAP STATS FOR {main_player_name.upper()} (this run) ---{Style.RESET_ALL}")
+                stats_map=df_player.groupby('MapName', observed=True).agg(P=('MatchID','nunique'),V=('WonMatch','sum'),KDA_avg=('KDA','mean'),Dmg=('DamageDealt','mean'),H=('Healing','mean')).sort_values(by='P',ascending=False)
                 if not stats_map.empty:
                     stats_map.loc[:,'WR (%)']=(stats_map['V']/stats_map['P']*100)
                     cols_d_map={'P':None,'V':None,'WR (%)':lambda x:f"{x:.1f}%",'KDA_avg':lambda x:f"{x:.2f}",'Dmg':lambda x:f"{x:,.0f}",'H':lambda x:f"{x:,.0f}"}
                     f_cols_map=[c for c in cols_d_map if c in stats_map.columns];f_fmt_map={k:v for k,v in cols_d_map.items() if k in f_cols_map and v is not None}
                     print(stats_map[f_cols_map].head(TOP_N_RELATIONS).to_string(formatters=f_fmt_map if f_fmt_map else None))
-                    if CSV_CFG.get("generate_map_stats_csv"): stats_map[f_cols_map].to_csv(f"map_stats_{main_player_name.replace(' ','_')}.csv",encoding='utf-8-sig'); logging.info(f"{Fore.GREEN}Map stats for this run saved.{Style.RESET_ALL}")
+                    if CSV_CFG.get("generate_map_stats_csv"): stats_map[f_cols_map].to_csv(f"map_stats_{main_player_name.replace(' ','_')}.csv",encoding='utf-8-sig'); log.info(f"{Fore.GREEN}Map stats for this run saved.{Style.RESET_ALL}")
 
     # --- CONSOLE SUMMARIES ---
     if not df_rels.empty:
-        logging.info(f"{Fore.CYAN}--- RELATIONSHIP SUMMARY FOR {main_player_name.upper()} (this run) ---{Style.RESET_ALL}")
+        log.info(f"{Fore.CYAN}--- RELATIONSHIP SUMMARY FOR {main_player_name.upper()} (this run) ---{Style.RESET_ALL}")
         top_a=df_rels[df_rels['PlayedWith_Games']>0].head(TOP_N_RELATIONS)
         if not top_a.empty:
-            logging.info(f"{Fore.GREEN}  Most frequent teammates (Top {TOP_N_RELATIONS}):{Style.RESET_ALL}")
-            for _,r in top_a.iterrows(): logging.info(f"    - {r['OtherPlayerName']} ({Fore.GREEN}{int(r['With_Wins'])}W{Style.RESET_ALL} - {Fore.RED}{int(r['With_Losses'])}L{Style.RESET_ALL}) | {r['PlayedWith_Games']} games | WR: {r['PlayedWith_WinRate (%)']:.1f}%")
+            log.info(f"{Fore.GREEN}  Most frequent teammates (Top {TOP_N_RELATIONS}):{Style.RESET_ALL}")
+            for _,r in top_a.iterrows(): log.info(f"    - {r['OtherPlayerName']} ({Fore.GREEN}{int(r['With_Wins'])}W{Style.RESET_ALL} - {Fore.RED}{int(r['With_Losses'])}L{Style.RESET_ALL}) | {r['PlayedWith_Games']} games | WR: {r['PlayedWith_WinRate (%)']:.1f}%")
         top_e=df_rels[df_rels['PlayedVs_Games']>0].sort_values(by='PlayedVs_Games',ascending=False).head(TOP_N_RELATIONS)
         if not top_e.empty:
-            logging.info(f"{Fore.RED}  Most frequent opponents (Top {TOP_N_RELATIONS}):{Style.RESET_ALL}")
-            for _,r in top_e.iterrows(): logging.info(f"    - {r['OtherPlayerName']} (Your record: {Fore.GREEN}{int(r['MainPlayer_Wins_Vs'])}W{Style.RESET_ALL} - {Fore.RED}{int(r['MainPlayer_Losses_Vs'])}L{Style.RESET_ALL}) | {r['PlayedVs_Games']} games vs | Your WR: {r['WinRateVs_ForMainPlayer (%)']:.1f}%")
+            log.info(f"{Fore.RED}  Most frequent opponents (Top {TOP_N_RELATIONS}):{Style.RESET_ALL}")
+            for _,r in top_e.iterrows(): log.info(f"    - {r['OtherPlayerName']} (Your record: {Fore.GREEN}{int(r['MainPlayer_Wins_Vs'])}W{Style.RESET_ALL} - {Fore.RED}{int(r['MainPlayer_Losses_Vs'])}L{Style.RESET_ALL}) | {r['PlayedVs_Games']} games vs | Your WR: {r['WinRateVs_ForMainPlayer (%)']:.1f}%")
 
-    logging.info(f"{Fore.CYAN}--- GLOBAL STATS SUMMARY FOR {main_player_name.upper()} (based on {matches_found} new matches in this run) ---{Style.RESET_ALL}")
+    log.info(f"{Fore.CYAN}--- GLOBAL STATS SUMMARY FOR {main_player_name.upper()} (based on {matches_found} new matches in this run) ---{Style.RESET_ALL}")
     if matches_found > 0:
         wr=(wins/matches_found*100);
-        logging.info(f"{Fore.GREEN}  Matches Analyzed (this run): {matches_found}{Style.RESET_ALL}")
-        logging.info(f"{Fore.GREEN}  Victories (this run): {wins} ({wr:.2f}%){Style.RESET_ALL}")
+        log.info(f"{Fore.GREEN}  Matches Analyzed (this run): {matches_found}{Style.RESET_ALL}")
+        log.info(f"{Fore.GREEN}  Victories (this run): {wins} ({wr:.2f}%){Style.RESET_ALL}")
         if not df_run_stats.empty:
-            df_main_numeric = df_run_stats[df_run_stats['PlayerID']==str(main_player_id)].copy()
+            df_main_numeric = df_run_stats[df_run_stats['PlayerID']==str(main_player_id)]
             if not df_main_numeric.empty:
-                for col in ['KDA','Kills','Deaths','Assists','DamageDealt','Healing','Shielding','Credits','CPM','Level']:
-                    if col in df_main_numeric.columns: df_main_numeric.loc[:, col] = pd.to_numeric(df_main_numeric[col], errors='coerce')
                 means={c:df_main_numeric[c].mean() if c in df_main_numeric.columns and df_main_numeric[c].notna().any() else float('nan') for c in ['KDA','Kills','Deaths','Assists','DamageDealt','Healing','Shielding','Credits','CPM','Level']}
-                logging.info(f"  Avg KDA: {Fore.CYAN}{means['KDA']:.2f}{Style.RESET_ALL}" if pd.notna(means['KDA']) else "  KDA: N/A")
-                logging.info(f"  Avg K/D/A: {Fore.CYAN}{means['Kills']:.1f}/{means['Deaths']:.1f}/{means['Assists']:.1f}{Style.RESET_ALL}" if all(pd.notna(m) for m in [means['Kills'],means['Deaths'],means['Assists']]) else "  K/D/A: N/A")
-                logging.info(f"  Avg Damage: {Fore.CYAN}{means['DamageDealt']:,.0f}{Style.RESET_ALL}" if pd.notna(means['DamageDealt']) else "  Damage: N/A")
-                logging.info(f"  Avg Healing: {Fore.CYAN}{means['Healing']:,.0f}{Style.RESET_ALL}" if pd.notna(means['Healing']) else "  Healing: N/A")
-                logging.info(f"  Avg Shielding: {Fore.CYAN}{means['Shielding']:,.0f}{Style.RESET_ALL}" if pd.notna(means['Shielding']) else "  Shielding: N/A")
-                logging.info(f"  Avg Credits: {Fore.CYAN}{means['Credits']:,.0f}{Style.RESET_ALL}" if pd.notna(means['Credits']) else "  Credits: N/A")
+                log.info(f"  Avg KDA: {Fore.CYAN}{means['KDA']:.2f}{Style.RESET_ALL}" if pd.notna(means['KDA']) else "  KDA: N/A")
+                log.info(f"  Avg K/D/A: {Fore.CYAN}{means['Kills']:.1f}/{means['Deaths']:.1f}/{means['Assists']:.1f}{Style.RESET_ALL}" if all(pd.notna(m) for m in [means['Kills'],means['Deaths'],means['Assists']]) else "  K/D/A: N/A")
+                log.info(f"  Avg Damage: {Fore.CYAN}{means['DamageDealt']:,.0f}{Style.RESET_ALL}" if pd.notna(means['DamageDealt']) else "  Damage: N/A")
+                log.info(f"  Avg Healing: {Fore.CYAN}{means['Healing']:,.0f}{Style.RESET_ALL}" if pd.notna(means['Healing']) else "  Healing: N/A")
+                log.info(f"  Avg Shielding: {Fore.CYAN}{means['Shielding']:,.0f}{Style.RESET_ALL}" if pd.notna(means['Shielding']) else "  Shielding: N/A")
+                log.info(f"  Avg Credits: {Fore.CYAN}{means['Credits']:,.0f}{Style.RESET_ALL}" if pd.notna(means['Credits']) else "  Credits: N/A")
+
+def replay_matches_from_cache():
+    """Rebuilds the Matches/MatchPlayerStats rows of every cached match page without touching the network."""
+    if not HTML_CACHE: log.critical(f"{Fore.RED}--replay needs 'enable_html_cache' in cache_options ({CONFIG_FILE}).{Style.RESET_ALL}"); return
+    if not DB_CFG.get("enable_sqlite") or not DB_CURSOR: log.critical(f"{Fore.RED}--replay needs SQLite enabled.{Style.RESET_ALL}"); return
+    # Only (url, fetched_at, path) is kept per page: the HTML is read back one page at a time. A URL cached
+    # under both compressions is replayed from its newest copy.
+    newest = {}
+    for url, fetched_at, path in HTML_CACHE.iter_index():
+        if "/match/" in url and (url not in newest or fetched_at > newest[url][0]): newest[url] = (fetched_at, path)
+    entries = sorted(newest.items(), key=lambda e: int(e[0].split("/")[-1]) if e[0].split("/")[-1].isdigit() else 0, reverse=True)
+    log.info(f"{Fore.MAGENTA}=== Replaying {len(entries)} cached match pages from {HTML_CACHE.cache_dir} ==={Style.RESET_ALL}")
+    replayed, rows = 0, 0
+    for url, (fetched_at, path) in entries:
+        entry = HTML_CACHE.load(path)
+        if not entry: continue
+        with METRICS.timer("match_parse"): parsed = parse_match_records(url, entry[1], fetched_at)
+        # The stored rows are only replaced by a successful parse: a page the current parser rejects keeps its old rows
+        if not parsed or not parsed[0]: METRICS.inc("matches_failed"); log.warning(f"{Fore.YELLOW}No player data parsed from cached {url}; stored rows kept.{Style.RESET_ALL}"); continue
+        delete_match_from_sqlite(url.split("/")[-1])
+        match_data, _, _ = record_parsed_match(url, parsed, None, "")
+        replayed += 1; rows += len(match_data)
+    flush_sqlite_writes()
+    if DB_CONN: DB_CONN.commit()
+    rebuild_aggregate_tables()
+    log.info(f"{Fore.GREEN}Replay finished: {replayed}/{len(entries)} matches, {rows} player rows rebuilt.{Style.RESET_ALL}")
+
+def report_all_time_stats(player_id):
+    """All-time relationship, champion and map summaries for any player, read from the aggregate tables."""
+    if not DB_CFG.get("enable_sqlite") or not DB_CONN: log.critical(f"{Fore.RED}All-time reports need SQLite enabled.{Style.RESET_ALL}"); return
+    import pandas as pd
+    flush_sqlite_writes(); player_id = str(player_id)
+    label = f"{player_display_name(player_id) or 'player'} (ID: {player_id})"
+    champs = pd.read_sql_query("SELECT Champion, Games AS P, Wins AS V, 100.0 * Wins / Games AS 'WR (%)', KDASum / Games AS KDA_avg, 1.0 * Kills / Games AS K, 1.0 * Deaths / Games AS D, 1.0 * Assists / Games AS A, 1.0 * DamageDealt / Games AS Dmg, 1.0 * Healing / Games AS H, 1.0 * Shielding / Games AS S, 1.0 * LevelSum / Games AS L FROM PlayerChampionStats WHERE PlayerID = ? ORDER BY Games DESC LIMIT ?", DB_CONN, params=(player_id, TOP_N_RELATIONS), index_col='Champion')
+    if champs.empty: log.warning(f"{Fore.YELLOW}No aggregated data for player ID {player_id}. Run --rebuild-aggregates if the database predates the aggregate tables.{Style.RESET_ALL}"); return
+    totals = DB_CONN.execute("SELECT SUM(Games), SUM(Wins) FROM PlayerChampionStats WHERE PlayerID = ?", (player_id,)).fetchone()
+    log.info(f"{Fore.CYAN}--- ALL-TIME STATS FOR {label.upper()}: {totals[0]} matches, {totals[1]} wins ({totals[1] / totals[0] * 100:.2f}%) ---{Style.RESET_ALL}")
+    print(champs.to_string(formatters={'WR (%)':lambda x:f"{x:.1f}%",'KDA_avg':lambda x:f"{x:.2f}",'K':lambda x:f"{x:.1f}",'D':lambda x:f"{x:.1f}",'A':lambda x:f"{x:.1f}",'Dmg':lambda x:f"{x:,.0f}",'H':lambda x:f"{x:,.0f}",'S':lambda x:f"{x:,.0f}",'L':lambda x:f"{x:.0f}"}))
+    maps = pd.read_sql_query("SELECT MapName, Games AS P, Wins AS V, 100.0 * Wins / Games AS 'WR (%)', KDASum / Games AS KDA_avg, 1.0 * DamageDealt / Games AS Dmg, 1.0 * Healing / Games AS H FROM PlayerMapStats WHERE PlayerID = ? ORDER BY Games DESC LIMIT ?", DB_CONN, params=(player_id, TOP_N_RELATIONS), index_col='MapName')
+    if not maps.empty: print(maps.to_string(formatters={'WR (%)':lambda x:f"{x:.1f}%",'KDA_avg':lambda x:f"{x:.2f}",'Dmg':lambda x:f"{x:,.0f}",'H':lambda x:f"{x:,.0f}"}))
+    for title, color, order_col, games_col, wins_col in (("Most frequent teammates", Fore.GREEN, "WithGames", "WithGames", "WithWins"), ("Most frequent opponents", Fore.RED, "VsGames", "VsGames", "VsWins")):
+        rows = DB_CONN.execute(f"SELECT OtherPlayerName, {games_col}, {wins_col} FROM PlayerRelations WHERE PlayerID = ? AND {games_col} > 0 ORDER BY {order_col} DESC LIMIT ?", (player_id, TOP_N_RELATIONS)).fetchall()
+        if rows: log.info(f"{color}  {title} (Top {TOP_N_RELATIONS}, all time):{Style.RESET_ALL}")
+        for other_name, games, wins in rows: log.info(f"    - {other_name} ({Fore.GREEN}{wins}W{Style.RESET_ALL} - {Fore.RED}{games - wins}L{Style.RESET_ALL}) | {games} games | WR: {wins / games * 100:.1f}%")
+
+# --- CO-PLAY GRAPH ---
+# PlayerRelations is the co-play graph as a sparse count matrix: one row per (player, other) pair that shared a
+# match, with with/vs game and win counts, updated in the same transaction as every batch of match inserts.
+# Rows are symmetric and clustered by PlayerID (WITHOUT ROWID), so a player's neighbours are one primary-key range.
+RELATION_COLUMNS = {'with': ('WithGames', 'WithWins'), 'vs': ('VsGames', 'VsWins')}
+def player_display_name(player_id):
+    """Latest known name of a player, read through any neighbour's edge back to them (two primary-key lookups)."""
+    row = DB_CONN.execute("SELECT r.OtherPlayerName FROM PlayerRelations n JOIN PlayerRelations r ON r.PlayerID = n.OtherPlayerID AND r.OtherPlayerID = n.PlayerID WHERE n.PlayerID = ? LIMIT 1", (str(player_id),)).fetchone()
+    return row[0] if row else None
+def top_coplayers(player_id, relation="with", k=10):
+    """[(other_id, other_name, games, wins)] of the k players most often met as teammates ('with') or opponents ('vs')."""
+    games_col, wins_col = RELATION_COLUMNS[relation]
+    return DB_CONN.execute(f"SELECT OtherPlayerID, OtherPlayerName, {games_col}, {wins_col} FROM PlayerRelations WHERE PlayerID = ? AND {games_col} > 0 ORDER BY {games_col} DESC, OtherPlayerID LIMIT ?", (str(player_id), k)).fetchall()
+def common_coplayers(player_ids, relation="vs", k=10):
+    """
+    Players met by several of player_ids (e.g. a premade's common opponents): [(other_id, other_name, members_met,
+    games, wins)], ranked by how many members met them, then by total games. Wins are counted for the members.
+    """
+    games_col, wins_col = RELATION_COLUMNS[relation]; ids = [str(p) for p in dict.fromkeys(player_ids)]
+    return DB_CONN.execute(f"""SELECT OtherPlayerID, MAX(OtherPlayerName), COUNT(*) AS Members, SUM({games_col}) AS Games, SUM({wins_col}) FROM PlayerRelations
+        WHERE PlayerID IN ({', '.join('?' * len(ids))}) AND {games_col} > 0 AND OtherPlayerID NOT IN ({', '.join('?' * len(ids))})
+        GROUP BY OtherPlayerID HAVING COUNT(*) > 1 ORDER BY Members DESC, Games DESC, OtherPlayerID LIMIT ?""", ids + ids + [k]).fetchall()
+def report_coplay_graph(player_ids, k=None):
+    """Top teammates/opponents of one player, or the common teammates/opponents of several (a premade)."""
+    if not DB_CFG.get("enable_sqlite") or not DB_CONN: log.critical(f"{Fore.RED}Co-play queries need SQLite enabled.{Style.RESET_ALL}"); return
+    flush_sqlite_writes(); k = k or TOP_N_RELATIONS
+    labels = [f"{player_display_name(pid) or 'Unknown'} ({pid})" for pid in player_ids]
+    for relation, title, color in (("with", "teammates", Fore.GREEN), ("vs", "opponents", Fore.RED)):
+        start = time.perf_counter()
+        if len(player_ids) == 1: rows = [(other_id, name, None, games, wins) for other_id, name, games, wins in top_coplayers(player_ids[0], relation, k)]
+        else: rows = common_coplayers(player_ids, relation, k)
+        log.info(f"{color}  {'Top' if len(player_ids) == 1 else 'Common'} {title} of {', '.join(labels)} (top {k}, {(time.perf_counter() - start) * 1000:.1f} ms):{Style.RESET_ALL}")
+        if not rows: log.info("    (none)")
+        for other_id, name, members, games, wins in rows:
+            met_by = f" | met by {members}/{len(player_ids)}" if members else ""
+            log.info(f"    - {name} ({other_id}) | {games} games | {Fore.GREEN}{wins}W{Style.RESET_ALL} - {Fore.RED}{games - wins}L{Style.RESET_ALL} | WR: {wins / games * 100:.1f}%{met_by}")
+
+def snowball_candidates(n, exclude=()):
+    """
+    The n most-connected players whose own history was never crawled: ranked by distinct co-players (graph degree),
+    then total shared games. Returns [(player_id, player_name, degree, games)].
+    """
+    rows = DB_CONN.execute("""SELECT PlayerID, COUNT(*) AS Degree, SUM(WithGames + VsGames) AS Games FROM PlayerRelations
+        WHERE PlayerID NOT IN (SELECT PlayerID FROM PlayerWatermarks) AND PlayerID NOT IN (SELECT PlayerID FROM SnowballVisits)
+          AND PlayerID NOT IN (SELECT PlayerID FROM FrontierScans WHERE Complete = 1)
+        GROUP BY PlayerID ORDER BY Degree DESC, Games DESC, PlayerID""").fetchall()
+    exclude, candidates = {str(p) for p in exclude}, []
+    for pid, degree, games in rows:
+        if pid in exclude or not is_real_player_id(pid): continue
+        name = player_display_name(pid)
+        if name: candidates.append((pid, name, degree, games))
+        if len(candidates) >= n: break
+    return candidates
+def process_snowball_crawl(players_per_round, rounds=1, exclude=()):
+    """Snowball crawl: each round analyzes the histories of the most-connected players not crawled yet, growing the graph outward."""
+    if not DB_CFG.get("enable_sqlite") or not DB_CONN: log.critical(f"{Fore.RED}Snowball crawl needs SQLite enabled.{Style.RESET_ALL}"); return
+    for round_no in range(1, rounds + 1):
+        flush_sqlite_writes()
+        candidates = snowball_candidates(players_per_round, exclude)
+        if not candidates: log.warning(f"{Fore.YELLOW}Snowball: no uncrawled players left in the co-play graph.{Style.RESET_ALL}"); return
+        log.info(f"{Fore.MAGENTA}=== Snowball round {round_no}/{rounds}: {', '.join(f'{name} ({pid}, {degree} co-players)' for pid, name, degree, _ in candidates)} ==={Style.RESET_ALL}")
+        for pid, name, _, _ in candidates:
+            with DB_CONN: DB_CONN.execute("INSERT OR REPLACE INTO SnowballVisits (PlayerID, VisitedAt) VALUES (?, ?)", (pid, datetime.now().isoformat()))
+            process_player_analysis(name, pid)
+
+def compare_parser_backends(paths=None):
+    """
+    Parses saved match pages (HTML files, or every cached match page when no paths are given) with every
+    backend in MATCH_PARSER_BACKENDS and reports any page where the per-player dicts differ. Returns True if all agree.
+    """
+    if not paths and not HTML_CACHE: log.critical(f"{Fore.RED}No pages to compare. Pass HTML files or enable the HTML cache.{Style.RESET_ALL}"); return False
+    def iter_pages():  # one page in memory at a time, however large the cache
+        for path in paths or ():
+            with open(path, 'r', encoding='utf-8') as f: yield f"{MATCH_BASE_URL}/match/{os.path.splitext(os.path.basename(path))[0]}", f.read(), datetime.fromtimestamp(os.path.getmtime(path))
+        if not paths: yield from (entry for entry in HTML_CACHE.iter_entries() if "/match/" in entry[0])
+    backends, mismatches, n_pages = list(MATCH_PARSER_BACKENDS), 0, 0
+    timings = {name: 0.0 for name in backends}
+    for url, html, fetched_at in iter_pages():
+        n_pages += 1
+        results = {}
+        for name in backends:
+            start = time.perf_counter(); results[name] = parse_match_records(url, html, fetched_at, backend=name); timings[name] += time.perf_counter() - start
+        reference = results[backends[0]]
+        for name in backends[1:]:
+            if results[name] != reference: mismatches += 1; log.error(f"{Fore.RED}Parser mismatch on {url}: '{backends[0]}' vs '{name}'{Style.RESET_ALL}")
+    for name in backends: log.info(f"{Fore.CYAN}  {name}: {timings[name] / max(n_pages, 1) * 1000:.2f} ms/page{Style.RESET_ALL}")
+    if mismatches: log.error(f"{Fore.RED}{mismatches} mismatches across {n_pages} pages.{Style.RESET_ALL}"); return False
+    log.info(f"{Fore.GREEN}All parser backends agree on {n_pages} pages.{Style.RESET_ALL}"); return True
+
+# --- LIBRARY API ---
+# Module state starts from the built-in defaults: config.json is only read by the CLI or when a caller asks for it.
+RUNTIME_GLOBALS = ('DB_CONN', 'DB_CURSOR', 'PENDING_MATCH_ROWS', 'PENDING_PLAYER_ROWS', 'PENDING_MATCH_IDS', 'PENDING_MATCH_PLAYERS', 'METRICS')
+apply_config(copy.deepcopy(DEFAULT_CONFIG))
+STATE_GLOBALS = ('config',) + CONFIG_GLOBALS + RUNTIME_GLOBALS
+ANALYZER_LOCK = threading.RLock()
+
+class Analyzer:
+    """
+    Embeddable entry point. An Analyzer owns its config, SQLite connection, HTTP session pool, rate limiter,
+    HTML cache and run metrics, and reads no config.json unless `config_file` is given (`config` overrides it
+    section by section). The scraping functions run on module-level state, so every call swaps this
+    analyzer's state in under ANALYZER_LOCK: several analyzers can share a process, but their calls run one at a time.
+
+        with Analyzer({"database_options": {"db_filename": "service.sqlite"}}) as analyzer:
+            results = analyzer.analyze_players({"Makoichi": "9256237", "Teammate": "1234567"}, group=True)
+    """
+    def __init__(self, config=None, config_file=None):
+        self.config = merge_config(load_config(config_file) if config_file else copy.deepcopy(DEFAULT_CONFIG), copy.deepcopy(config or {}))
+        self.state = None
+    @contextmanager
+    def active(self):
+        """Runs the enclosed module-level calls on this analyzer's state; the SQLite connection is opened on first use."""
+        with ANALYZER_LOCK:
+            g = globals(); saved = {name: g[name] for name in STATE_GLOBALS}
+            try:
+                if self.state is None:
+                    apply_config(self.config)
+                    g.update(DB_CONN=None, DB_CURSOR=None, PENDING_MATCH_ROWS=[], PENDING_PLAYER_ROWS=[], PENDING_MATCH_IDS=set(), PENDING_MATCH_PLAYERS=[], METRICS=RunMetrics())
+                    init_sqlite()
+                else: g.update(self.state)
+                yield self
+            finally: self.state = {name: g[name] for name in STATE_GLOBALS}; g.update(saved)
+    def call(self, func, *args, **kwargs):
+        """Calls any module-level function (e.g. report_all_time_stats, process_snowball_crawl) on this analyzer's state."""
+        with self.active(): return func(*args, **kwargs)
+    def analyze_players(self, players, group=None):
+        """
+        Analyzes several players in one call. `players` is a {name: player_id} dict or a list of profile URLs and/or
+        (name, player_id) pairs; group=True crawls them as one deduplicated set of matches (default: the
+        group_crawl_tracked_players setting). Returns {name: summary}, each summary holding 'player_id', the
+        'matches' and 'wins' counted in this run, the run's rows as a DataFrame ('stats') and the
+        relationship counters keyed by the other player's ID ('relationships').
+        """
+        targets = {}
+        for item in (players.items() if isinstance(players, dict) else players):
+            name, pid = extract_info_from_url(item) if isinstance(item, str) else item
+            if name and pid: targets[name] = str(pid)
+        with self.active():
+            if group is None: group = GENERAL_CFG.get("group_crawl_tracked_players")
+            if group and len(targets) > 1: run_states = process_group_analysis(targets) or {}
+            else: run_states = {name: process_player_analysis(name, pid) for name, pid in targets.items()}
+        return {name: self._summary(pid, run_states.get(name)) for name, pid in targets.items()}
+    def analyze_player(self, player, player_id=None):
+        """One player, given as a profile URL or as name + player_id. Returns its analyze_players summary, or None for a bad URL."""
+        return next(iter(self.analyze_players([(player, player_id) if player_id else player], group=False).values()), None)
+    @staticmethod
+    def _summary(player_id, run_state):
+        run_state = run_state or new_player_run_state()
+        return {'player_id': player_id, 'matches': run_state['matches_found'], 'wins': run_state['wins'], 'stats': run_state['stats'].to_frame(),
+                'relationships': {pid: dict(d) for pid, d in run_state['relationships'].items()}}
+    def top_coplayers(self, player_id, relation="with", k=10):
+        """See top_coplayers(): [(other_id, other_name, games, wins)] from this analyzer's database."""
+        with self.active(): flush_sqlite_writes(); return top_coplayers(player_id, relation, k) if DB_CONN else []
+    def common_coplayers(self, player_ids, relation="vs", k=10):
+        """See common_coplayers(): [(other_id, other_name, members_met, games, wins)] from this analyzer's database."""
+        with self.active(): flush_sqlite_writes(); return common_coplayers(player_ids, relation, k) if DB_CONN else []
+    def metrics(self):
+        """Counters, gauges and stage timings of everything this analyzer ran (RunMetrics.to_dict())."""
+        with self.active(): return METRICS.to_dict()
+    def close(self):
+        """Hands back open frontier claims, flushes queued writes and closes the HTTP sessions and the SQLite connection."""
+        if self.state is None: return
+        with self.active():
+            if FRONTIER_ENABLED: release_frontier_claims()
+            close_http_pool(); close_sqlite()
+        self.state = None
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Paladins.Guru Match Analyzer.", epilog="Example with URL: python %(prog)s --url https://paladins.guru/profile/123456-PlayerName")
     parser.add_argument("--url", type=str, help="URL of a Paladins.Guru profile to analyze. Overrides 'players_to_track' in config.json.")
+    parser.add_argument("--group", action="store_true", help="Crawl all 'players_to_track' together: shared matches are fetched once and counted for every tracked player in them.")
+    parser.add_argument("--all-time", metavar="PLAYER_ID", help="Print all-time champion, map and relationship stats for any player ID from the aggregate tables, then exit.")
+    parser.add_argument("--rebuild-aggregates", action="store_true", help="Recompute the aggregate tables from MatchPlayerStats, then exit.")
+    parser.add_argument("--replay", action="store_true", help="Rebuild MatchPlayerStats from the raw HTML cache only, without network access.")
+    parser.add_argument("--compare-parsers", nargs="*", metavar="HTML_FILE", help="Check that every parser backend produces identical player data for the given saved match pages (default: every cached match page), then exit.")
+    parser.add_argument("--coplayers", nargs="+", metavar="PLAYER_ID", help="Top teammates and opponents of a player from the co-play graph, or the common ones of several players (a premade), then exit.")
+    parser.add_argument("--snowball", type=int, metavar="N", help="Snowball crawl: analyze the N most-connected players of the co-play graph whose history was never crawled.")
+    parser.add_argument("--snowball-rounds", type=int, default=1, metavar="R", help="Number of --snowball rounds (default: 1).")
+    parser.add_argument("--worker", action="store_true", help="Claim and analyze pending matches from the shared crawl frontier (needs enable_frontier) until none are left; several workers can share one database.")
+    parser.add_argument("--metrics-out", metavar="FILE", help="Write run counters and stage timings to FILE: Prometheus text for .prom/.txt, JSON otherwise. Overrides metrics_options.export_file.")
+    parser.add_argument("--profile", nargs="?", const="paladins_profile.prof", metavar="FILE", help="Run under cProfile and save the stats to FILE (default: paladins_profile.prof) plus a readable FILE.txt.")
     args = parser.parse_args()
+    apply_config(load_config(create_if_missing=True)); configure_logging(config)
+    if args.compare_parsers is not None: raise SystemExit(0 if compare_parser_backends(args.compare_parsers) else 1)
+    profiler = start_profiling() if args.profile else None
     init_sqlite()
     try:
         targets_to_process = {}
@@ -436,11 +1783,27 @@ if __name__ == '__main__':
             player_name, player_id = extract_info_from_url(args.url)
             if player_name and player_id: targets_to_process[player_name] = player_id
         else: targets_to_process = config.get("players_to_track", {})
-        if not targets_to_process:
-            logging.critical(f"{Fore.RED}No players specified. Use the --url argument or add players to 'players_to_track' in {CONFIG_FILE}.{Style.RESET_ALL}")
+        if args.rebuild_aggregates or args.all_time or args.coplayers:
+            if args.rebuild_aggregates: rebuild_aggregate_tables()
+            if args.all_time: report_all_time_stats(args.all_time)
+            if args.coplayers: report_coplay_graph(args.coplayers)
+        elif args.replay: replay_matches_from_cache()
+        elif args.worker: process_frontier_worker()
+        elif args.snowball: process_snowball_crawl(args.snowball, max(1, args.snowball_rounds), config.get("players_to_track", {}).values())
+        elif not targets_to_process:
+            log.critical(f"{Fore.RED}No players specified. Use the --url argument or add players to 'players_to_track' in {CONFIG_FILE}.{Style.RESET_ALL}")
         else:
-            for name, pid_val in targets_to_process.items(): process_player_analysis(name, pid_val)
-            logging.info(f"{Fore.GREEN}--- Analysis complete for all specified players. ---{Style.RESET_ALL}")
-    except KeyboardInterrupt: logging.warning(f"\n{Fore.YELLOW}Analysis interrupted by user.{Style.RESET_ALL}")
-    except Exception as e: logging.critical(f"{Fore.RED}An unexpected error occurred: {e}{Style.RESET_ALL}", exc_info=True)
-    finally: close_sqlite()
\ No newline at end of file
+            if (args.group or GENERAL_CFG.get("group_crawl_tracked_players")) and len(targets_to_process) > 1: process_group_analysis(targets_to_process)
+            else:
+                for name, pid_val in targets_to_process.items(): process_player_analysis(name, pid_val)
+            log.info(f"{Fore.GREEN}--- Analysis complete for all specified players. ---{Style.RESET_ALL}")
+    except KeyboardInterrupt: log.warning(f"\n{Fore.YELLOW}Analysis interrupted by user.{Style.RESET_ALL}")
+    except Exception as e: log.critical(f"{Fore.RED}An unexpected error occurred: {e}{Style.RESET_ALL}", exc_info=True)
+    finally:
+        close_http_pool()
+        if FRONTIER_ENABLED: release_frontier_claims()
+        close_sqlite()
+        if profiler: save_profile(profiler, args.profile)
+        if METRICS_CFG.get("log_summary", True): METRICS.log_summary()
+        metrics_file = args.metrics_out or METRICS_CFG.get("export_file")
+        if metrics_file: METRICS.write(metrics_file)
\ No newline at end of file